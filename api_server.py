@@ -1,17 +1,58 @@
 import os
+import time
+import random
+import asyncio
 import logging
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from google.cloud import firestore
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from firestore_service import get_latest_report
+from firestore_service import build_industry_data_row, get_dashboard_snapshot, get_industry_history, get_latest_report
+from timeseries import downsample, slice_range
+from event_bus import INDUSTRY_DATA_UPDATED, EventBroker, format_sse, get_event_bus_address, start_listener
+from profiling import finish_request_timing, format_server_timing, start_request_timing, timed
+from universe import DEFAULT_UNIVERSE, UNIVERSES
 
 load_dotenv()
-app = FastAPI()
 logger = logging.getLogger(__name__)
 
+# --- 即時更新推送 ---
+# 排程任務發布的事件由本機 event bus 接收，再透過 /api/events (SSE) 推送給前端。
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+event_broker = EventBroker()
+
+def _handle_event(event: dict):
+    if event.get("type") == INDUSTRY_DATA_UPDATED:
+        # 讓下一個請求立即重新讀取新版的儀表板快照
+        _snapshot_cache["checked_at"] = 0.0
+    event_broker.publish_local(event)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    transport = None
+    if get_event_bus_address():
+        try:
+            transport = await start_listener(_handle_event)
+            logger.info(f"Listening for update events on {get_event_bus_address()}")
+        except OSError as e:
+            logger.error(f"Could not start the event listener, live updates are disabled: {e}")
+    yield
+    if transport:
+        transport.close()
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that reports its serialization time to Server-Timing."""
+
+    def render(self, content) -> bytes:
+        with timed("serialize"):
+            return super().render(content)
+
+app = FastAPI(lifespan=lifespan, default_response_class=TimedJSONResponse)
+
 origins = ["*"]
 
 app.add_middleware(
@@ -22,6 +63,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- 請求效能抽樣 ---
+# PROFILE_API_SAMPLE_RATE (0~1) 比例的請求會附上 Server-Timing 標頭，
+# 區分 Firestore 讀取、JSON 序列化與總耗時。SSE 長連線不抽樣。
+PROFILE_API_SAMPLE_RATE = float(os.getenv("PROFILE_API_SAMPLE_RATE", "0"))
+
+@app.middleware("http")
+async def server_timing_middleware(request: Request, call_next):
+    if PROFILE_API_SAMPLE_RATE <= 0 or request.url.path == "/api/events" or random.random() >= PROFILE_API_SAMPLE_RATE:
+        return await call_next(request)
+
+    token = start_request_timing()
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        timings = finish_request_timing(token)
+    total = time.perf_counter() - started
+    response.headers["Server-Timing"] = format_server_timing(timings, total)
+    logger.info(f"Server-Timing {request.method} {request.url.path}: {response.headers['Server-Timing']}")
+    return response
+
 # --- Firestore 客戶端 ---
 import json
 from google.oauth2 import service_account
@@ -41,15 +103,59 @@ except Exception as e:
 
 from fastapi.staticfiles import StaticFiles
 
+# --- 儀表板快照快取 ---
+# 快照由每日的 sp500 更新任務預先序列化後發布；API 在 TTL 內直接回傳記憶體中的內容，
+# 過期後只讀取一份快照文件，版本未變時沿用既有內容。
+SNAPSHOT_CACHE_TTL = float(os.getenv("SNAPSHOT_CACHE_TTL", "60"))
+_snapshot_cache = {"version": None, "body": None, "checked_at": 0.0}
+
+def _load_dashboard_snapshot():
+    now = time.monotonic()
+    if _snapshot_cache["body"] is not None and now - _snapshot_cache["checked_at"] < SNAPSHOT_CACHE_TTL:
+        return _snapshot_cache
+    with timed("firestore"):
+        snapshot = get_dashboard_snapshot(db)
+    if not snapshot:
+        return None
+    if snapshot["version"] != _snapshot_cache["version"]:
+        _snapshot_cache["version"] = snapshot["version"]
+        _snapshot_cache["body"] = snapshot["payload"].encode("utf-8")
+    _snapshot_cache["checked_at"] = now
+    return _snapshot_cache
+
 # --- API 路由 ---
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to the Industry Weekly API!"}
 
+@app.get("/api/events")
+async def stream_events(request: Request):
+    """
+    以 Server-Sent Events 推送資料更新事件 (industry_data.updated、industry_report.updated)，
+    前端收到後只需重新取得有變動的資料。
+    """
+    queue = event_broker.subscribe()
+
+    async def event_stream():
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                    yield format_sse(event)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+        finally:
+            event_broker.unsubscribe(queue)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
+
 @app.get("/api/industry-data")
-async def get_all_industry_data():
+async def get_all_industry_data(request: Request, universe: str = DEFAULT_UNIVERSE):
     """
-    從 Firestore 的 'industry_data' 集合中獲取所有文件。
+    回傳所有產業資料。S&P 500 優先使用預先發布的儀表板快照，
+    快照不存在或查詢其他指數 (universe) 時才從對應的 Firestore 集合即時組裝。
     """
     if not db:
         error_message = "Firestore client is not available."
@@ -57,31 +163,59 @@ async def get_all_industry_data():
             # 將捕獲到的具體錯誤訊息回傳給前端，方便除錯
             error_message += f" Reason: {initialization_error}"
         raise HTTPException(status_code=503)
+    if universe not in UNIVERSES:
+        raise HTTPException(status_code=400, detail=f"Unknown universe '{universe}'. Available: {', '.join(UNIVERSES)}")
 
     try:
-        collection_ref = db.collection('industry_data')
-        docs = collection_ref.stream()
-        
-        data = []
-        for doc in docs:
-            doc_data = doc.to_dict()
-
-            data.append({
-                "industry_name": doc.id,
-                "pe_today": doc_data.get('pe_today'),
-                "preview_summary": doc_data.get('preview_summary', ''),
-                "top_stocks": doc_data.get('top_stocks', []),
-                "etf_roi": doc_data.get('etf_roi'),
-                "pe_high_1y": doc_data.get('pe_high_1y'),
-                "pe_low_1y": doc_data.get('pe_low_1y'),
-                "market_breadth_200d": round(doc_data.get('market_breadth_200d'), 1) if isinstance(doc_data.get('market_breadth_200d'), (int, float)) else doc_data.get('market_breadth_200d')
-            })
-            
+        snapshot = _load_dashboard_snapshot() if universe == DEFAULT_UNIVERSE else None
+        if snapshot:
+            etag = f'"{snapshot["version"]}"'
+            if request.headers.get("if-none-match") == etag:
+                return Response(status_code=304, headers={"ETag": etag})
+            return Response(content=snapshot["body"], media_type="application/json", headers={"ETag": etag})
+
+        if universe == DEFAULT_UNIVERSE:
+            logger.warning("Dashboard snapshot not found, building industry data from Firestore documents.")
+        collection_ref = db.collection(UNIVERSES[universe]["collection"])
+        with timed("firestore"):
+            docs = list(collection_ref.stream())
+        data = [build_industry_data_row(doc.id, doc.to_dict()) for doc in docs]
         return {"data": data}
     except Exception as e:
         logger.error(f"An error occurred while fetching data from Firestore: {e}")
         return {"error": str(e)}
 
+# 歷史查詢每涵蓋一個年份就多讀一份文件，限制單次查詢可跨越的年份數。
+MAX_HISTORY_YEARS = int(os.getenv("MAX_HISTORY_YEARS", "5"))
+
+@app.get("/api/industry-data/{industry_name}/history")
+async def get_industry_data_history(industry_name: str, start: str = None, end: str = None, points: int = 200):
+    """
+    回傳指定產業在日期區間內的每日指標歷史 (預設為最近一年)，
+    並抽樣至最多 points 筆，供前端繪製趨勢圖。
+    """
+    if not db:
+        raise HTTPException(status_code=503, detail="Firestore client is not available.")
+
+    try:
+        end_date = datetime.strptime(end, '%Y-%m-%d').date() if end else datetime.utcnow().date()
+        start_date = datetime.strptime(start, '%Y-%m-%d').date() if start else end_date - timedelta(days=365)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be dates in YYYY-MM-DD format.")
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start must not be after end.")
+    if end_date.year - start_date.year + 1 > MAX_HISTORY_YEARS:
+        raise HTTPException(status_code=400, detail=f"The date range must not span more than {MAX_HISTORY_YEARS} years.")
+
+    start_str, end_str = start_date.isoformat(), end_date.isoformat()
+    with timed("firestore"):
+        history = get_industry_history(db, industry_name, start_str, end_str)
+    if not history:
+        raise HTTPException(status_code=404, detail=f"No history found for industry '{industry_name}'.")
+
+    series = downsample(slice_range(history, start_str, end_str), points)
+    return {"industry_name": industry_name, "start": start_str, "end": end_str, **series}
+
 @app.get("/api/industry-reports/{industry_name}/latest")
 async def get_latest_industry_report(industry_name: str):
     """
@@ -91,7 +225,8 @@ async def get_latest_industry_report(industry_name: str):
         raise HTTPException(status_code=503)
 
     try:
-        report = get_latest_report(db, industry_name)
+        with timed("firestore"):
+            report = get_latest_report(db, industry_name)
         if not report:
             raise HTTPException(status_code=404, detail=f"No report found for industry '{industry_name}'.")
 
@@ -136,7 +271,8 @@ async def get_single_industry_report(industry_name: str, report_date: str):
     try:
         document_id = f"{industry_name}_{report_date}"
         doc_ref = db.collection('industry_reports').document(document_id)
-        doc = doc_ref.get()
+        with timed("firestore"):
+            doc = doc_ref.get()
 
         if not doc.exists:
             raise HTTPException(status_code=404, detail=f"Report for industry '{industry_name}' on date '{report_date}' not found.")
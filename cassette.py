@@ -0,0 +1,163 @@
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# CASSETTE_MODE=record|replay 時，FMP 與 Gemini 的呼叫，以及會影響流程的 Firestore 讀取會被錄製或重播。
+# CASSETTE_PATH 指定封存檔位置，CASSETTE_REPLAY_LATENCY=1 時重播會重現原始延遲。
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+DEFAULT_CASSETTE_PATH = "cassettes/run.jsonl.gz"
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when a request has no recorded response left."""
+
+
+# 請求中的日期（查詢區間、prompt 內的報告日期）在比對時一律遮蔽，
+# 讓隔天重播同一份封存檔仍能命中。
+_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def _request_key(kind: str, request: dict) -> str:
+    key = json.dumps({"kind": kind, "request": request}, sort_keys=True, ensure_ascii=False, default=str)
+    return _DATE_PATTERN.sub("<date>", key)
+
+
+class Cassette:
+    """
+    Records calls to external services into a gzipped JSON-lines archive, or
+    replays them deterministically from one.
+
+    Each entry holds the kind of call ("fmp", "gemini"), the request, the
+    response and the observed latency. Repeated identical requests are served
+    in the order they were recorded.
+
+    In record mode ``truncate`` starts a fresh archive; otherwise entries are
+    appended to the existing file.
+    """
+
+    def __init__(self, path: str, mode: str, replay_latency: bool = False, truncate: bool = False):
+        if mode not in (MODE_RECORD, MODE_REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self._lock = threading.Lock()
+        self._entries = defaultdict(deque)
+
+        if mode == MODE_REPLAY:
+            self._load()
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if truncate:
+                open(path, "wb").close()
+
+    def _load(self):
+        count = 0
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                key = _request_key(entry["kind"], entry["request"])
+                self._entries[key].append(entry)
+                count += 1
+        logger.info(f"Loaded {count} recorded calls from cassette {self.path}")
+
+    def _append(self, entry: dict):
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        # 每筆紀錄各自壓成一個 gzip member，並以單次 append 寫入，
+        # 多個執行緒或行程同時錄製時也不會互相截斷。
+        member = gzip.compress(line.encode("utf-8"))
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.write(member)
+
+    def call(self, kind: str, request: dict, fetch: Callable[[], Any]) -> Any:
+        """
+        Runs ``fetch`` through the cassette.
+
+        In record mode the live call is made and its response stored; in
+        replay mode the next recorded response for the same request is
+        returned without calling ``fetch``.
+        """
+        if self.mode == MODE_REPLAY:
+            key = _request_key(kind, request)
+            with self._lock:
+                queue = self._entries.get(key)
+                entry = queue.popleft() if queue else None
+            if entry is None:
+                raise CassetteMiss(f"No recorded {kind} response for request: {request}")
+            if self.replay_latency:
+                time.sleep(entry.get("latency", 0.0))
+            return entry["response"]
+
+        started = time.perf_counter()
+        response = fetch()
+        latency = time.perf_counter() - started
+        self._append({
+            "kind": kind,
+            "request": request,
+            "response": response,
+            "latency": round(latency, 4),
+            "recorded_at": time.time(),
+        })
+        return response
+
+
+def is_replaying() -> bool:
+    """
+    True when calls are replayed from a cassette. Callers skip side effects
+    (Firestore writes, event bus publishes) so a replay never touches
+    production data.
+    """
+    return os.getenv("CASSETTE_MODE", "").strip().lower() == MODE_REPLAY
+
+
+def record_call(kind: str, request: dict, fetch: Callable[[], Any]) -> Any:
+    """Runs ``fetch`` through the active cassette, or directly when none is configured."""
+    cassette = get_active_cassette()
+    if cassette:
+        return cassette.call(kind, request, fetch)
+    return fetch()
+
+
+_active_cassette = None
+_active_config = None
+_active_lock = threading.Lock()
+
+
+def get_active_cassette() -> Optional[Cassette]:
+    """
+    Returns the cassette configured by the environment, or None when disabled.
+
+    Recording starts a fresh archive in the main process; worker processes
+    (see universe.run_sharded) append to the archive the main process opened.
+    """
+    global _active_cassette, _active_config
+    mode = os.getenv("CASSETTE_MODE", "").strip().lower()
+    if not mode:
+        return None
+    config = (
+        mode,
+        os.getenv("CASSETTE_PATH", DEFAULT_CASSETTE_PATH),
+        os.getenv("CASSETTE_REPLAY_LATENCY", "").lower() in ("1", "true", "yes"),
+    )
+    with _active_lock:
+        if _active_cassette is None or _active_config != config:
+            _active_cassette = Cassette(config[1], config[0], replay_latency=config[2],
+                                        truncate=multiprocessing.parent_process() is None)
+            _active_config = config
+            logger.info(f"Cassette {mode} mode enabled: {config[1]}")
+        return _active_cassette
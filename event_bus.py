@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 本機的 pub/sub 替代方案：排程任務 (scheduler.py) 與 API 伺服器是不同行程，
+# 事件以 UDP datagram 傳到 API 伺服器，再由 EventBroker 推送給所有 SSE 訂閱者。
+# 日後可換成 Cloud Pub/Sub 等正式的訊息服務，publish 與訂閱端介面不需改變。
+DEFAULT_EVENT_BUS_ADDRESS = "127.0.0.1:8765"
+
+INDUSTRY_DATA_UPDATED = "industry_data.updated"
+INDUSTRY_REPORT_UPDATED = "industry_report.updated"
+
+
+def _parse_address(address: str) -> tuple:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def get_event_bus_address() -> Optional[str]:
+    """EVENT_BUS_ADDRESS 設為空字串時停用事件發布。"""
+    address = os.getenv("EVENT_BUS_ADDRESS", DEFAULT_EVENT_BUS_ADDRESS).strip()
+    return address or None
+
+
+def publish(event_type: str, address: str = None, **data) -> bool:
+    """
+    發布事件給 API 伺服器。採 fire-and-forget，API 伺服器未啟動時事件會被丟棄，
+    不影響排程任務本身。
+    """
+    address = address or get_event_bus_address()
+    if not address:
+        return False
+    event = {"type": event_type, "data": data, "published_at": int(time.time() * 1000)}
+    try:
+        payload = json.dumps(event, ensure_ascii=False, default=str).encode("utf-8")
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(payload, _parse_address(address))
+        logger.info(f"Published event {event_type}: {data}")
+        return True
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to publish event {event_type}: {e}")
+        return False
+
+
+def format_sse(event: dict) -> str:
+    """將事件轉為 Server-Sent Events 格式。"""
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    return f"id: {event.get('published_at', '')}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+class EventBroker:
+    """
+    In-process fan-out of events to subscriber queues. Slow subscribers do
+    not block others: when a subscriber's queue is full the event is dropped
+    for that subscriber only.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish_local(self, event: dict):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.warning(f"Subscriber queue full, dropped event {event.get('type')}")
+
+
+class _EventProtocol(asyncio.DatagramProtocol):
+    def __init__(self, handler: Callable[[dict], None]):
+        self.handler = handler
+
+    def datagram_received(self, data, addr):
+        try:
+            event = json.loads(data.decode("utf-8"))
+            if not isinstance(event, dict) or "type" not in event:
+                raise ValueError("missing event type")
+        except ValueError as e:
+            logger.warning(f"Ignored malformed event from {addr}: {e}")
+            return
+        self.handler(event)
+
+
+async def start_listener(handler: Callable[[dict], None], address: str = None):
+    """在目前的 event loop 上接收已發布的事件，回傳 transport，關閉時呼叫 transport.close()。"""
+    address = address or get_event_bus_address()
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _EventProtocol(handler),
+        local_addr=_parse_address(address),
+    )
+    return transport
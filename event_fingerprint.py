@@ -0,0 +1,71 @@
+import hashlib
+import json
+import re
+from typing import Optional
+from urllib.parse import urlsplit
+
+# 第一階段 (generate_industry_events) 輸出的事件集合指紋，用來判斷產業本週事件
+# 是否與上週幾乎相同，相同時可沿用上週的週報而不必重跑第二階段與預覽摘要。
+
+_WHITESPACE = re.compile(r"\s+")
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+
+def parse_events(json_text: str) -> Optional[list]:
+    """解析第一階段輸出的 JSON 陣列 (容許前後的 ``` 區塊標記)，無法解析時回傳 None。"""
+    if not json_text:
+        return None
+    try:
+        events = json.loads(_CODE_FENCE.sub("", json_text.strip()))
+    except ValueError:
+        return None
+    if not isinstance(events, list):
+        return None
+    return [event for event in events if isinstance(event, dict)]
+
+
+def _normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return f"{host}{parts.path.rstrip('/')}"
+
+
+def event_key(event: dict) -> str:
+    """
+    事件的正規化鍵：優先使用去除查詢參數的來源連結，沒有連結時改用標題。
+    同一事件每次生成的標題與摘要措辭可能不同，但來源連結通常一致。
+    """
+    url = event.get("source_url") or ""
+    if url.strip():
+        return "url:" + _normalize_url(url)
+    title = _WHITESPACE.sub(" ", str(event.get("title") or "")).strip().lower()
+    return "title:" + title
+
+
+def build_fingerprint(json_text: str) -> Optional[dict]:
+    """
+    建立事件集合的指紋：'event_hashes' 為各事件鍵的短雜湊 (排序後)，
+    'hash' 為整個集合的雜湊。無法解析或沒有事件時回傳 None。
+    """
+    events = parse_events(json_text)
+    if not events:
+        return None
+    event_hashes = sorted({hashlib.sha256(event_key(event).encode("utf-8")).hexdigest()[:16] for event in events})
+    return {
+        "hash": hashlib.sha256(",".join(event_hashes).encode("utf-8")).hexdigest(),
+        "event_hashes": event_hashes,
+    }
+
+
+def similarity(fingerprint: Optional[dict], other: Optional[dict]) -> float:
+    """兩個指紋的 Jaccard 相似度 (0~1)，任一方缺少時為 0。"""
+    if not fingerprint or not other:
+        return 0.0
+    if fingerprint.get("hash") == other.get("hash"):
+        return 1.0
+    a, b = set(fingerprint.get("event_hashes") or []), set(other.get("event_hashes") or [])
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
@@ -1,7 +1,11 @@
 import os
+import json
+import time
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
 from datetime import datetime
+
+from timeseries import append_point, concat_histories, empty_history, history_point
 # from dotenv import load_dotenv
 # load_dotenv()
 # Firestore client will be passed in from api_server.py
@@ -67,4 +71,144 @@ def get_latest_report(db: firestore.Client, industry_name: str):
         return None
     except Exception as e:
         print(f"An error occurred while fetching the report from Firestore: {e}")
-        return None
\ No newline at end of file
+        return None
+
+DASHBOARD_SNAPSHOT_COLLECTION = "dashboard_snapshots"
+DASHBOARD_SNAPSHOT_DOCUMENT = "industry_data"
+# 快照內容格式變更時遞增，API 遇到不認得的版本會改走即時組裝。
+DASHBOARD_SNAPSHOT_SCHEMA = 1
+
+def build_industry_data_row(industry_name: str, doc_data: dict) -> dict:
+    """
+    將 'industry_data' 文件轉換為 /api/industry-data 回傳的單筆資料格式。
+
+    Args:
+        industry_name (str): 產業名稱 (文件 ID)。
+        doc_data (dict): 文件內容。
+
+    Returns:
+        dict: API 回傳的產業資料。
+    """
+    market_breadth = doc_data.get('market_breadth_200d')
+    return {
+        "industry_name": industry_name,
+        "pe_today": doc_data.get('pe_today'),
+        "preview_summary": doc_data.get('preview_summary', ''),
+        "top_stocks": doc_data.get('top_stocks', []),
+        "etf_roi": doc_data.get('etf_roi'),
+        "pe_high_1y": doc_data.get('pe_high_1y'),
+        "pe_low_1y": doc_data.get('pe_low_1y'),
+        "market_breadth_200d": round(market_breadth, 1) if isinstance(market_breadth, (int, float)) else market_breadth
+    }
+
+def publish_dashboard_snapshot(db: firestore.Client, rows: list):
+    """
+    將 /api/industry-data 的完整回應預先序列化，寫入單一快照文件。
+
+    Args:
+        db (firestore.Client): The Firestore client instance.
+        rows (list): build_industry_data_row 產生的產業資料列表。
+
+    Returns:
+        int: 快照版本號 (毫秒時間戳)，失敗時返回 None。
+    """
+    try:
+        version = int(time.time() * 1000)
+        payload = json.dumps({"data": rows}, ensure_ascii=False, default=str)
+        db.collection(DASHBOARD_SNAPSHOT_COLLECTION).document(DASHBOARD_SNAPSHOT_DOCUMENT).set({
+            "schema": DASHBOARD_SNAPSHOT_SCHEMA,
+            "version": version,
+            "generated_at": datetime.utcnow(),
+            "payload": payload,
+        })
+        print(f"Successfully published dashboard snapshot version {version} ({len(rows)} industries).")
+        return version
+    except Exception as e:
+        print(f"An error occurred while publishing the dashboard snapshot: {e}")
+        return None
+
+def get_dashboard_snapshot(db: firestore.Client):
+    """
+    讀取最新的儀表板快照。
+
+    Args:
+        db (firestore.Client): The Firestore client instance.
+
+    Returns:
+        dict: 含 'version' 與 'payload' (JSON 字串) 的快照，不存在或格式不符時返回 None。
+    """
+    try:
+        doc = db.collection(DASHBOARD_SNAPSHOT_COLLECTION).document(DASHBOARD_SNAPSHOT_DOCUMENT).get()
+        if not doc.exists:
+            return None
+        snapshot = doc.to_dict()
+        if snapshot.get('schema') != DASHBOARD_SNAPSHOT_SCHEMA or not snapshot.get('payload'):
+            return None
+        return snapshot
+    except Exception as e:
+        print(f"An error occurred while fetching the dashboard snapshot from Firestore: {e}")
+        return None
+
+INDUSTRY_HISTORY_COLLECTION = "industry_history"
+
+def _history_document_id(industry_name: str, year: int) -> str:
+    return f"{industry_name}_{year}"
+
+def append_industry_history(db: firestore.Client, rows: list, day: str):
+    """
+    將當日各產業的指標附加到每產業、每年一份的欄式歷史文件。
+
+    Args:
+        db (firestore.Client): The Firestore client instance.
+        rows (list): build_industry_data_row 產生的產業資料列表。
+        day (str): 資料日期 (YYYY-MM-DD)。
+
+    Returns:
+        int: 更新的文件數量，失敗時返回 None。
+    """
+    try:
+        year = int(day[:4])
+        collection = db.collection(INDUSTRY_HISTORY_COLLECTION)
+        refs = {row['industry_name']: collection.document(_history_document_id(row['industry_name'], year)) for row in rows}
+        # 一次批次讀取所有產業當年的文件，再以單一批次寫回。
+        existing = {doc.id: doc.to_dict() for doc in db.get_all(list(refs.values())) if doc.exists}
+
+        batch = db.batch()
+        for row in rows:
+            industry_name = row['industry_name']
+            doc_ref = refs[industry_name]
+            history = existing.get(doc_ref.id) or empty_history(industry_name, year)
+            append_point(history, day, history_point(row))
+            batch.set(doc_ref, history)
+        batch.commit()
+        print(f"Successfully appended {day} history for {len(rows)} industries.")
+        return len(rows)
+    except Exception as e:
+        print(f"An error occurred while appending industry history to Firestore: {e}")
+        return None
+
+def get_industry_history(db: firestore.Client, industry_name: str, start: str, end: str):
+    """
+    讀取指定產業在日期區間內的歷史指標，每個涵蓋到的年份只需讀取一份文件。
+
+    Args:
+        db (firestore.Client): The Firestore client instance.
+        industry_name (str): 產業名稱。
+        start (str): 起始日期 (YYYY-MM-DD)。
+        end (str): 結束日期 (YYYY-MM-DD)。
+
+    Returns:
+        dict: 串接後的欄式歷史資料 (尚未裁切區間)，找不到任何資料時返回 None。
+    """
+    try:
+        collection = db.collection(INDUSTRY_HISTORY_COLLECTION)
+        refs = [collection.document(_history_document_id(industry_name, year))
+                for year in range(int(start[:4]), int(end[:4]) + 1)]
+        histories = [doc.to_dict() for doc in db.get_all(refs) if doc.exists]
+        if not histories:
+            print(f"No history found for industry: {industry_name}")
+            return None
+        return concat_histories(histories)
+    except Exception as e:
+        print(f"An error occurred while fetching industry history from Firestore: {e}")
+        return None
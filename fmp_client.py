@@ -3,28 +3,48 @@ import logging
 from typing import Optional
 import datetime
 
+from cassette import get_active_cassette
+from rate_limiter import CircuitOpenError, RateController, get_default_controller
+
 logger = logging.getLogger(__name__)
 
 class FMPClient:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, rate_controller: Optional[RateController] = None):
         if not api_key:
             raise ValueError("FMP API key is required.")
         self.api_key = api_key
         self.base_url = "https://financialmodelingprep.com"
+        # 同一行程內的所有 FMPClient 預設共用一個速率控制器，共享方案額度。
+        self.rate_controller = rate_controller or get_default_controller()
 
     def _request(self, endpoint: str, params: dict = None) -> Optional[dict]:
         if params is None:
             params = {}
+        cassette = get_active_cassette()
+        if cassette:
+            # API key 不寫入封存檔，也不參與比對。
+            request = {"endpoint": endpoint, "params": dict(params)}
+            return cassette.call("fmp", request, lambda: self._fetch(endpoint, params))
+        return self._fetch(endpoint, params)
+
+    def _fetch(self, endpoint: str, params: dict) -> Optional[dict]:
         params['apikey'] = self.api_key
         url = f"{self.base_url}/{endpoint}"
         try:
-            response = requests.get(url, params=params)
+            response = self.rate_controller.execute(
+                endpoint.strip('/'),
+                lambda: requests.get(url, params=params, timeout=30),
+                retry_exceptions=(requests.exceptions.ConnectionError, requests.exceptions.Timeout),
+            )
             response.raise_for_status()
             data = response.json()
             if not data:
                 logger.warning(f"No data found for endpoint {url} with params {params}")
                 return None
             return data
+        except CircuitOpenError as e:
+            logger.error(f"Skipped request to {url}: {e}")
+            return None
         except requests.exceptions.RequestException as e:
             logger.error(f"Error fetching from {url}: {e}")
             return None
@@ -34,6 +54,27 @@ class FMPClient:
         sp500_data = self._request(endpoint)
         return sp500_data
 
+    def get_nasdaq100(self):
+        endpoint = "api/v3/nasdaq_constituent"
+        nasdaq_data = self._request(endpoint)
+        return nasdaq_data
+
+    def get_etf_holdings(self, symbol: str):
+        """Gets the holdings of an ETF, used as a proxy for indexes without a constituents endpoint."""
+        if not symbol:
+            return None
+        endpoint = "stable/etf/holdings"
+        holdings = self._request(endpoint, params={"symbol": symbol})
+        return holdings
+
+    def get_profiles(self, symbols: list[str]):
+        """Gets company profiles (including sector) for a list of symbols in a single API call."""
+        if not symbols:
+            return None
+        endpoint = f"api/v3/profile/{','.join(symbols)}"
+        profiles = self._request(endpoint)
+        return profiles
+
     def get_market_caps_for_list(self, symbols: list[str]):
         """Gets market capitalization for a list of symbols in a single API call."""
         if not symbols:
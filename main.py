@@ -1,6 +1,10 @@
 from fmp_client import FMPClient
 from report_generator import ReportGenerator
-from firestore_service import save_report
+from firestore_service import db, get_latest_report, save_report
+from event_bus import INDUSTRY_REPORT_UPDATED, publish
+from profiling import profiled
+from cassette import is_replaying, record_call
+from event_fingerprint import build_fingerprint, similarity
 import os
 import datetime
 import logging
@@ -10,6 +14,11 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 本週第一階段事件與上一份週報的相似度達此門檻時，沿用上一份週報而不重新生成。
+REPORT_REUSE_THRESHOLD = float(os.getenv("REPORT_REUSE_THRESHOLD", "0.8"))
+# 連續沿用的週數上限，避免事件緩慢變化時週報一直未被重新撰寫。
+MAX_REPORT_REUSE_STREAK = int(os.getenv("MAX_REPORT_REUSE_STREAK", "2"))
+
 class Main:
     def __init__(self):
         self.fmp_client = FMPClient(api_key=os.getenv('FMP_API_KEY'))
@@ -36,35 +45,90 @@ class Main:
             print(f"正在處理產業: {sector}")
             print(f"----------------------------------------")
             json_data = self.report_generator.generate_industry_events(sector, today)
-            report_data = self.report_generator.generate_weekly_report(sector, today, json_data)
-            full_report = report_data.get('full_report_text', '')
-
-            paragraphs = full_report.strip().split('\n\n')
-            paragraphs = [p.strip() for p in paragraphs if p.strip()]
-            report_part_1 = ""
-            report_part_2 = ""
-
-            if len(paragraphs) > 1:
-                report_part_1 = paragraphs[1]
-                if len(paragraphs) > 2:
-                    report_part_2 = '\n\n'.join(paragraphs[2:])
-            report_data['report_part_1'] = report_part_1
-            report_data['report_part_2'] = report_part_2
-            report_data.pop('full_report_text', None)
-
-            if report_part_1:
-                logger.info("正在生成預覽摘要...")
-                preview_summary = self.report_generator.generate_preview_summary(report_part_1)
-                report_data['preview_summary'] = preview_summary
-                print(f"\n生成的預覽摘要: {preview_summary}")
+            fingerprint = build_fingerprint(json_data)
+            previous_report = self.get_previous_report(sector['sector'])
+            reused_report = self.reuse_previous_report(sector, today, json_data, fingerprint, previous_report)
+            if reused_report:
+                report_data = reused_report
             else:
-                report_data['preview_summary'] = ""
+                report_data = self.generate_full_report(sector, today, json_data)
+            report_data['events_fingerprint'] = fingerprint
 
             report_data['industry_name'] = sector['sector']
+            if is_replaying():
+                # 重播只重現生成流程，不寫入週報也不發布事件。
+                logger.info(f"重播模式：略過儲存 '{sector}' 的報告。")
+                continue
             logger.info(f"準備將 '{sector}' 的報告儲存至 Firestore...")
-            save_report(report_data=report_data)
+            document_id = save_report(report_data=report_data)
+            if document_id:
+                publish(INDUSTRY_REPORT_UPDATED, industry_name=sector['sector'], document_id=document_id)
             print(f"完成產業 '{sector}' 的報告生成與儲存。")
 
+    def get_previous_report(self, industry_name: str):
+        """
+        讀取該產業的上一份週報。查詢會經過 cassette，重播時沿用錄製當下的結果，
+        讓是否沿用週報的判斷與錄製時一致。
+        """
+        return record_call(
+            "firestore", {"op": "get_latest_report", "industry_name": industry_name},
+            lambda: get_latest_report(db, industry_name) if db else None,
+        )
+
+    def reuse_previous_report(self, sector, today, json_data: str, fingerprint: dict, previous_report: dict):
+        """
+        本週事件指紋與上一份週報相似度達門檻時，沿用其內文與預覽摘要並更新標題與事件資料，
+        回傳新的報告資料；不符合條件時回傳 None。
+        """
+        if not fingerprint or not previous_report or not previous_report.get('report_part_1'):
+            return None
+        reuse_streak = previous_report.get('reuse_streak', 0)
+        if reuse_streak >= MAX_REPORT_REUSE_STREAK:
+            return None
+        score = similarity(fingerprint, previous_report.get('events_fingerprint'))
+        if score < REPORT_REUSE_THRESHOLD:
+            return None
+
+        logger.info(f"'{sector['sector']}' 本週事件與上一份週報相似度 {score:.2f}，沿用上一份週報。")
+        return {
+            "title": f"{sector} 產業週報 {today.strftime('%Y-%m-%d')}",
+            "source_events_json": json_data,
+            "report_part_1": previous_report.get('report_part_1', ''),
+            "report_part_2": previous_report.get('report_part_2', ''),
+            "preview_summary": previous_report.get('preview_summary', ''),
+            "reused_from": previous_report.get('title'),
+            "reuse_similarity": round(score, 3),
+            "reuse_streak": reuse_streak + 1,
+        }
+
+    def generate_full_report(self, sector, today, json_data: str) -> dict:
+        """執行第二階段週報生成與預覽摘要，回傳分段後的報告資料。"""
+        report_data = self.report_generator.generate_weekly_report(sector, today, json_data)
+        full_report = report_data.get('full_report_text', '')
+
+        paragraphs = full_report.strip().split('\n\n')
+        paragraphs = [p.strip() for p in paragraphs if p.strip()]
+        report_part_1 = ""
+        report_part_2 = ""
+
+        if len(paragraphs) > 1:
+            report_part_1 = paragraphs[1]
+            if len(paragraphs) > 2:
+                report_part_2 = '\n\n'.join(paragraphs[2:])
+        report_data['report_part_1'] = report_part_1
+        report_data['report_part_2'] = report_part_2
+        report_data.pop('full_report_text', None)
+
+        if report_part_1:
+            logger.info("正在生成預覽摘要...")
+            preview_summary = self.report_generator.generate_preview_summary(report_part_1)
+            report_data['preview_summary'] = preview_summary
+            print(f"\n生成的預覽摘要: {preview_summary}")
+        else:
+            report_data['preview_summary'] = ""
+        return report_data
+
+@profiled("job.run_main")
 def run_main():
     main_app = Main()
     main_app.process_main()
@@ -0,0 +1,157 @@
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# PROFILE_JOBS=1 時，被 @profiled 包裝的排程任務與更新步驟會輸出 cProfile 結果
+# (.prof 與文字摘要) 到 PROFILE_DIR，並在 runs.jsonl 追加每次執行的 wall/CPU 時間。
+DEFAULT_PROFILE_DIR = "profiles"
+
+# Python 3.12 以前 cProfile 只追蹤啟用它的執行緒，每個執行緒可以各有一個 profiler；
+# 3.12 起整個行程同時只能啟用一個 (第二個會引發 ValueError)，改以行程層級的鎖限制，
+# 其他同時執行的呼叫只記錄時間。
+PER_THREAD_PROFILERS = sys.version_info < (3, 12)
+_profiler_lock = threading.Lock()
+_thread_state = threading.local()
+
+
+def profiling_enabled() -> bool:
+    return os.getenv("PROFILE_JOBS", "").lower() in ("1", "true", "yes")
+
+
+def _write_run(profile_dir: str, name: str, started_at: datetime, profiler: Optional[cProfile.Profile],
+               summary: dict):
+    os.makedirs(profile_dir, exist_ok=True)
+    base = os.path.join(profile_dir, f"{started_at.strftime('%Y%m%dT%H%M%S%f')}_{name}")
+    if profiler:
+        profiler.dump_stats(f"{base}.prof")
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(30)
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+        summary["profile"] = f"{base}.prof"
+    with open(os.path.join(profile_dir, "runs.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps(summary, ensure_ascii=False) + "\n")
+
+
+def _start_profiler() -> Optional[cProfile.Profile]:
+    """Starts a profiler unless one is already active on this thread (or, on 3.12+, in this process)."""
+    if getattr(_thread_state, "profiler", None) is not None:
+        return None
+    if not PER_THREAD_PROFILERS and not _profiler_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # 其他工具 (例如外部的 profiler) 已在使用中。
+        if not PER_THREAD_PROFILERS:
+            _profiler_lock.release()
+        return None
+    _thread_state.profiler = profiler
+    return profiler
+
+
+def _stop_profiler(profiler: cProfile.Profile):
+    profiler.disable()
+    _thread_state.profiler = None
+    if not PER_THREAD_PROFILERS:
+        _profiler_lock.release()
+
+
+def profiled(name: str, profile: bool = True):
+    """
+    Profiles each call of the wrapped function when PROFILE_JOBS is set.
+
+    A call nested inside another profiled call on the same thread records
+    timings without starting a second profiler. Before Python 3.12 calls on
+    different threads are profiled independently; from 3.12 only one profiler
+    can be active per process, so concurrent calls record timings only.
+
+    ``profile=False`` records timings only, for jobs whose steps are profiled
+    themselves (e.g. steps run on TaskGraph threads).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not profiling_enabled():
+                return fn(*args, **kwargs)
+
+            profiler = _start_profiler() if profile else None
+            started_at = datetime.utcnow()
+            wall_start = time.perf_counter()
+            process_cpu_start = time.process_time()
+            thread_cpu_start = time.thread_time()
+            status = "ok"
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                if profiler:
+                    _stop_profiler(profiler)
+                summary = {
+                    "name": name,
+                    "started_at": started_at.isoformat(),
+                    "status": status,
+                    "wall_s": round(time.perf_counter() - wall_start, 3),
+                    "process_cpu_s": round(time.process_time() - process_cpu_start, 3),
+                    "thread_cpu_s": round(time.thread_time() - thread_cpu_start, 3),
+                }
+                try:
+                    _write_run(os.getenv("PROFILE_DIR", DEFAULT_PROFILE_DIR), name, started_at, profiler, summary)
+                except OSError as e:
+                    logger.error(f"Could not write profile for {name}: {e}")
+                logger.info(f"Profiled {name}: wall {summary['wall_s']}s, "
+                            f"CPU {summary['process_cpu_s']}s (thread {summary['thread_cpu_s']}s)")
+        return wrapper
+    return decorator
+
+
+# --- Server-Timing ---
+# 被抽樣的 API 請求會在 context 中放一個計時表，處理過程中以 timed() 累計各階段耗時。
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request_timing():
+    return _request_timings.set({})
+
+
+def finish_request_timing(token) -> dict:
+    timings = _request_timings.get() or {}
+    _request_timings.reset(token)
+    return timings
+
+
+@contextmanager
+def timed(metric: str):
+    """Adds the elapsed time of the block to the current request's timings, if it is sampled."""
+    timings = _request_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[metric] = timings.get(metric, 0.0) + (time.perf_counter() - started)
+
+
+def format_server_timing(timings: dict, total: float) -> str:
+    """Formats timings (in seconds) as a Server-Timing header value in milliseconds."""
+    parts = [f"{metric};dur={seconds * 1000:.1f}" for metric, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
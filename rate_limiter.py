@@ -0,0 +1,303 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised when an endpoint's circuit breaker is open and calls are refused."""
+
+
+def parse_retry_after(value: Optional[str], now: float = None) -> Optional[float]:
+    """Parses a Retry-After header (seconds or HTTP date) into a delay in seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    if now is None:
+        now = time.time()
+    return max(0.0, retry_at - now)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. ``acquire`` blocks until a token is available,
+    or until a pause set by ``pause_for`` (e.g. from Retry-After) has passed.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("Token bucket rate and capacity must be positive.")
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+    def pause_for(self, seconds: float):
+        with self._lock:
+            now = self._clock()
+            self._paused_until = max(self._paused_until, now + seconds)
+            # 暫停期間不累積額度，避免恢復後瞬間湧出大量請求。
+            self._tokens = 0
+            self._updated = self._paused_until
+
+    def set_rate(self, rate: float, capacity: float):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("Token bucket rate and capacity must be positive.")
+        with self._lock:
+            self._refill(self._clock())
+            self.rate = rate
+            self.capacity = capacity
+            self._tokens = min(self._tokens, capacity)
+
+
+class AIMDLimiter:
+    """
+    Concurrency limiter with additive-increase / multiplicative-decrease:
+    each success raises the limit by roughly one slot per window, each
+    throttled response (429/5xx) cuts it by ``decrease_factor``.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 16, decrease_factor: float = 0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self._limit = float(max(minimum, min(initial, maximum)))
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @contextmanager
+    def slot(self):
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify()
+
+    def on_success(self):
+        with self._condition:
+            previous = int(self._limit)
+            self._limit = min(self.maximum, self._limit + 1.0 / self._limit)
+            if int(self._limit) > previous:
+                self._condition.notify()
+
+    def on_throttle(self):
+        with self._condition:
+            self._limit = max(self.minimum, self._limit * self.decrease_factor)
+            logger.warning(f"Throttled by upstream, concurrency limit lowered to {self.limit}")
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker. After ``failure_threshold`` consecutive
+    failed calls the circuit opens for ``reset_timeout`` seconds; then a
+    single trial call is let through (half-open) to decide whether to close.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.state = self.CLOSED
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def release_trial(self):
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+
+
+class RateController:
+    """
+    Client-side rate control for an HTTP API: a shared token bucket for the
+    plan's request quota, an AIMD concurrency limit, Retry-After aware
+    retries, and one circuit breaker per endpoint.
+    """
+
+    def __init__(self, requests_per_minute: int = 300, max_concurrency: int = 8, max_retries: int = 3,
+                 backoff_base: float = 1.0, failure_threshold: int = 5, reset_timeout: float = 60.0,
+                 sleep: Callable[[float], None] = time.sleep):
+        rate = requests_per_minute / 60.0
+        # 容量設為每秒額度，允許小量突發但不會一次耗盡整分鐘的配額。
+        self.bucket = TokenBucket(rate=rate, capacity=max(1.0, rate), sleep=sleep)
+        self.concurrency = AIMDLimiter(initial=max_concurrency, maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._sleep = sleep
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "RateController":
+        return cls(
+            requests_per_minute=int(os.getenv("FMP_RATE_LIMIT_PER_MINUTE", "300")),
+            max_concurrency=int(os.getenv("FMP_MAX_CONCURRENCY", "8")),
+            max_retries=int(os.getenv("FMP_MAX_RETRIES", "3")),
+        )
+
+    def set_rate(self, requests_per_minute: float):
+        """Changes the request quota, e.g. when part of it is handed to worker processes."""
+        rate = requests_per_minute / 60.0
+        self.bucket.set_rate(rate=rate, capacity=max(1.0, rate))
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[endpoint]
+
+    @staticmethod
+    def _is_throttled(response) -> bool:
+        return response.status_code == 429 or response.status_code >= 500
+
+    def execute(self, endpoint: str, send: Callable[[], object], retry_exceptions: tuple = ()):
+        """
+        Sends a request through the controller and returns the final response.
+
+        ``send`` must return an object with ``status_code`` and ``headers``.
+        429 and 5xx responses are retried up to ``max_retries`` times, waiting
+        for Retry-After when present; the last response is returned if every
+        attempt is throttled. Raises CircuitOpenError when the endpoint's
+        breaker refuses the call. Any other exception from ``send`` counts as
+        a failure for the breaker and is re-raised.
+        """
+        breaker = self.breaker(endpoint)
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for endpoint '{endpoint}'")
+            self.bucket.acquire()
+            try:
+                with self.concurrency.slot():
+                    response = send()
+            except retry_exceptions as e:
+                if attempt >= self.max_retries:
+                    breaker.record_failure()
+                    raise
+                delay = self.backoff_base * (2 ** attempt)
+                logger.warning(f"Request to '{endpoint}' failed ({e}), retrying in {delay:.1f}s")
+            except BaseException:
+                # 非預期的例外也要記為失敗，否則 half-open 的試探名額不會釋放，
+                # 斷路器會一直拒絕此端點。
+                breaker.record_failure()
+                raise
+            else:
+                if not self._is_throttled(response):
+                    self.concurrency.on_success()
+                    breaker.record_success()
+                    return response
+
+                self.concurrency.on_throttle()
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if retry_after is not None:
+                    # Retry-After 套用在共用的 token bucket 上，所有併發請求一起退讓。
+                    self.bucket.pause_for(retry_after)
+                if attempt >= self.max_retries:
+                    breaker.record_failure()
+                    return response
+                if retry_after is not None:
+                    # 等待已由暫停中的 token bucket 負責，這裡不再重複睡眠。
+                    delay = 0.0
+                    logger.warning(f"Endpoint '{endpoint}' returned {response.status_code}, retrying after {retry_after:.1f}s")
+                else:
+                    delay = self.backoff_base * (2 ** attempt)
+                    logger.warning(f"Endpoint '{endpoint}' returned {response.status_code}, retrying in {delay:.1f}s")
+            # 釋放 half-open 的試探名額，讓重試能再次通過斷路器。
+            breaker.release_trial()
+            if delay > 0:
+                self._sleep(delay)
+            attempt += 1
+
+
+_default_controller = None
+_default_lock = threading.Lock()
+
+
+def get_default_controller() -> RateController:
+    """Returns the process-wide controller shared by every FMPClient instance."""
+    global _default_controller
+    with _default_lock:
+        if _default_controller is None:
+            _default_controller = RateController.from_env()
+        return _default_controller
@@ -4,11 +4,15 @@ import logging
 from google import genai
 from google.genai import types
 
+from cassette import get_active_cassette
+
 logger = logging.getLogger(__name__)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+MODEL_NAME = "gemini-2.5-flash"
+
 def _load_prompt_template(name: str) -> str:
     with open(f"prompts/{name}.txt", "r", encoding="utf-8") as f:
         return f.read()
@@ -23,25 +27,30 @@ class ReportGenerator:
         grounding_tool = types.Tool(google_search=types.GoogleSearch())
         self.config = types.GenerateContentConfig(tools=[grounding_tool])
 
-    def generate_industry_events(self, sector: str, date: datetime) -> str:
-        template = _load_prompt_template("report_stage1")
-        prompt = template.format(sector=sector, date=date)
+    def _generate_text(self, prompt: str) -> str:
+        cassette = get_active_cassette()
+        if cassette:
+            request = {"model": MODEL_NAME, "prompt": prompt}
+            return cassette.call("gemini", request, lambda: self._generate_live(prompt))
+        return self._generate_live(prompt)
+
+    def _generate_live(self, prompt: str) -> str:
         response = self.client.models.generate_content(
-            model="gemini-2.5-flash",
+            model=MODEL_NAME,
             contents=prompt,
             config=self.config
         )
         return response.text.strip()
+
+    def generate_industry_events(self, sector: str, date: datetime) -> str:
+        template = _load_prompt_template("report_stage1")
+        prompt = template.format(sector=sector, date=date)
+        return self._generate_text(prompt)
     
     def generate_weekly_report(self, sector: str, today: datetime.date, json_data: str):
         template = _load_prompt_template("report_stage2")
         prompt = template.format(sector=sector, date=today, json_data=json_data)
-        response = self.client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            config=self.config
-        )
-        report_text = response.text.strip()
+        report_text = self._generate_text(prompt)
         logger.info("週報文字已生成，準備轉換為結構化資料。")
         report_data = {
             "title": f"{sector} 產業週報 {today.strftime('%Y-%m-%d')}",
@@ -53,12 +62,7 @@ class ReportGenerator:
     def generate_preview_summary(self, report_part_1_text: str) -> str:
         template = _load_prompt_template("summarize_for_preview")
         prompt = template.format(report_part_1_text=report_part_1_text)
-        response = self.client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            config=self.config
-        )
-        report_text = response.text.strip()
+        report_text = self._generate_text(prompt)
         logger.info("週報文字已生成，準備轉換為結構化資料。")
 
         return report_text
\ No newline at end of file
@@ -1,13 +1,14 @@
 import schedule
 import time
 from main import run_main
-from sp500_sector import run_sp500_update
+from sp500_sector import run_extra_universe_updates, run_sp500_update
 import pytz
 from datetime import datetime
 
 def job_sp500():
     print("Running sp500_sector.py...")
     run_sp500_update()
+    run_extra_universe_updates()
 
 def job_main():
     print("Running main.py...")
@@ -15,12 +16,14 @@ def job_main():
 
 taipei_tz = pytz.timezone("Asia/Taipei")
 
-# schedule.every(1).minutes.do(job_sp500)
-# schedule.every(5).minutes.do(job_main)
-schedule.every().day.at("07:00", taipei_tz).do(job_sp500)
-schedule.every().monday.at("06:30", taipei_tz).do(job_main)
-print("Scheduler started. Press Ctrl+C to exit.")
+# 市場資料任務會以 spawn 啟動 worker 行程並重新載入此模組，排程迴圈必須只在主程式執行。
+if __name__ == '__main__':
+    # schedule.every(1).minutes.do(job_sp500)
+    # schedule.every(5).minutes.do(job_main)
+    schedule.every().day.at("07:00", taipei_tz).do(job_sp500)
+    schedule.every().monday.at("06:30", taipei_tz).do(job_main)
+    print("Scheduler started. Press Ctrl+C to exit.")
 
-while True:
-    schedule.run_pending()
-    time.sleep(1)
\ No newline at end of file
+    while True:
+        schedule.run_pending()
+        time.sleep(1)
\ No newline at end of file
@@ -1,29 +1,75 @@
 import os
+import argparse
 import logging
-import time
 from collections import defaultdict
 from datetime import date, timedelta
 
 from dotenv import load_dotenv
 from google.cloud import firestore
 
+from cassette import is_replaying, record_call
 from fmp_client import FMPClient
-from firestore_service import get_latest_report
+from rate_limiter import RateController
+from firestore_service import (
+    append_industry_history,
+    build_industry_data_row,
+    get_latest_report,
+    publish_dashboard_snapshot,
+)
+from task_graph import TaskGraph
+from universe import (
+    DEFAULT_UNIVERSE,
+    UNIVERSES,
+    get_universe,
+    load_constituents,
+    merge_market_breadth,
+    merge_top_market_caps,
+    expected_requests,
+    get_total_rate,
+    parent_rate_share,
+    plan_rate_shares,
+    run_sharded,
+)
+from event_bus import INDUSTRY_DATA_UPDATED, publish
+from profiling import profiled
 
 # 設定日誌
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 成分股會分片交給 worker 行程執行的任務，用來分配父行程與各 worker 的 FMP 額度。
+SHARDED_TASKS = {"top10_by_market_cap": "top_market_caps", "market_breadth": "market_breadth"}
+# 依此順序合併各任務對產業文件的欄位更新，與過去逐一執行時的覆寫順序一致。
+SECTOR_UPDATE_TASKS = ["top10_by_market_cap", "sector_details", "sp500_etf_roi", "market_breadth"]
+# 產業內取不到均線資料的股票比例超過此值時，不寫入該產業的市場廣度，保留前一次的值。
+BREADTH_MAX_MISSING_RATIO = float(os.getenv("BREADTH_MAX_MISSING_RATIO", "0.2"))
+
+def merge_sector_updates(updates_list) -> dict:
+    """將多個 {產業: 欄位} 更新依序合併，後者覆蓋前者的同名欄位。"""
+    merged = defaultdict(dict)
+    for updates in updates_list:
+        for sector, fields in (updates or {}).items():
+            merged[sector].update(fields)
+    return dict(merged)
+
 class SP500DataUpdater:
-    def __init__(self):
+    def __init__(self, universe: str = DEFAULT_UNIVERSE):
         load_dotenv()
         logger.info("正在初始化客戶端...")
+
+        self.universe_key = universe
+        self.universe = get_universe(universe)
+        self.collection_name = self.universe["collection"]
         
         fmp_api_key = os.getenv('FMP_API_KEY')
         if not fmp_api_key:
             raise ValueError("錯誤：找不到 FMP_API_KEY 環境變數。")
             
-        self.fmp_client = FMPClient(api_key=fmp_api_key)
+        # 父行程只使用保留給它的額度 (其餘分給 worker 行程)，因此使用自己的速率控制器而非行程共用的預設值。
+        self.fmp_client = FMPClient(api_key=fmp_api_key, rate_controller=RateController.from_env())
+        self.fmp_client.rate_controller.set_rate(max(1, get_total_rate() * parent_rate_share()))
+        # 本次 update_all_industry_data 會平行執行的分片任務，用來分配各任務的額度。
+        self._planned_shard_tasks = []
         
         try:
             self.db = firestore.Client()
@@ -32,60 +78,86 @@ class SP500DataUpdater:
             logger.error(f"初始化 Firestore client 時發生錯誤: {e}")
             self.db = None
 
-    def update_top10_by_market_cap_per_sector(self):
+    def _shard_rate_share(self, task: str, stocks: list) -> float:
+        """
+        依同時執行的分片任務預計的請求數分配 FMP 額度，回傳 task 可用的比例。
+        各任務取得相同的成分股，因此算出的分配彼此一致。
+        """
+        tasks = self._planned_shard_tasks if task in self._planned_shard_tasks else [task]
+        shares = plan_rate_shares({name: expected_requests(name, len(stocks)) for name in tasks})
+        return shares[task]
+
+    def _commit_sector_updates(self, updates: dict):
+        """以單一批次將 {產業: 欄位} 合併寫入此指數的產業資料集合。重播模式下不寫入。"""
+        if is_replaying():
+            logger.info(f"重播模式：略過寫入 {len(updates)} 份產業文件。")
+            return
+        batch = self.db.batch()
+        for sector, fields in updates.items():
+            doc_ref = self.db.collection(self.collection_name).document(sector)
+            batch.set(doc_ref, fields, merge=True)
+        batch.commit()
+
+    def _load_constituents(self, stocks: list = None):
+        if stocks is None:
+            stocks = load_constituents(self.fmp_client, self.universe_key)
+        if not stocks:
+            logger.error(f"無法獲取 {self.universe['name']} 列表，任務終止。")
+        return stocks
+
+    @profiled("sp500.update_top10_by_market_cap_per_sector")
+    def update_top10_by_market_cap_per_sector(self, stocks: list = None, commit: bool = True, top_n: int = 10) -> dict:
+        """
+        計算每個產業市值前 top_n 名的公司與即時股價。成分股會分片交給多個行程查詢市值，
+        再依產業合併各分片的結果。
+
+        回傳 {產業: {"top_stocks": [...]}}；commit 為 False 時只計算不寫入，
+        由呼叫端統一合併寫入。
+        """
         if not self.db:
             logger.error("Firestore client 未初始化，無法執行。")
-            return
+            return {}
 
-        logger.info("--- 開始更新市值前十名資料 ---")
-        sp500_stocks = self.fmp_client.get_sp500()
-        if not sp500_stocks:
-            logger.error("無法獲取 S&P 500 列表，任務終止。")
-            return
+        logger.info(f"--- 開始更新 {self.universe['name']} 市值前 {top_n} 名資料 ---")
+        stocks = self._load_constituents(stocks)
+        if not stocks:
+            return {}
 
-        stocks_by_sector = defaultdict(list)
-        for stock in sp500_stocks:
-            if stock.get('sector'):
-                stocks_by_sector[stock['sector']].append(stock)
-
-        top10_by_sector = {}
-        for sector, stocks in stocks_by_sector.items():
-            symbols_in_sector = [stock['symbol'] for stock in stocks]
-            market_cap_data = self.fmp_client.get_market_caps_for_list(symbols_in_sector)
-            if not market_cap_data:
-                logger.warning(f"無法獲取 '{sector}' 產業的市值資料，已略過。")
-                continue
-            sorted_stocks = sorted(market_cap_data, key=lambda x: x.get('marketCap', 0), reverse=True)
-            top10_stocks = sorted_stocks[:10]
-            top10_symbols = [stock['symbol'] for stock in top10_stocks]
-            if top10_symbols:
-                price_data = self.fmp_client.get_symbol_price(top10_symbols)
+        shard_results = run_sharded(self.fmp_client, "top_market_caps", stocks,
+                                    rate_share=self._shard_rate_share("top_market_caps", stocks), top_n=top_n)
+        top_by_sector = merge_top_market_caps(shard_results, top_n)
+
+        for sector, top_stocks in top_by_sector.items():
+            top_symbols = [stock['symbol'] for stock in top_stocks]
+            if top_symbols:
+                price_data = self.fmp_client.get_symbol_price(top_symbols) or []
                 price_map = {item['symbol']: {'price': item.get('price'), 'changePercentage': item.get('changePercentage')} for item in price_data}
-                for stock in top10_stocks:
+                for stock in top_stocks:
                     stock_price_info = price_map.get(stock['symbol'])
                     if stock_price_info:
                         stock['price'] = stock_price_info['price']
                         stock['changePercentage'] = stock_price_info['changePercentage']
 
-            top10_by_sector[sector] = top10_stocks
-        try:
-            collection_name = "industry_data"
-            batch = self.db.batch()
-            for sector, top_stocks in top10_by_sector.items():
-                doc_ref = self.db.collection(collection_name).document(sector)
-                batch.set(doc_ref, {"top_stocks": top_stocks}, merge=True)
-            batch.commit()
-            logger.info(f"市值前十名資料已成功合併寫入 '{collection_name}' 集合！")
-        except Exception as e:
-            logger.error(f"寫入市值資料到 Firestore 時發生錯誤: {e}")
+        updates = {sector: {"top_stocks": top_stocks} for sector, top_stocks in top_by_sector.items()}
+        if commit:
+            try:
+                self._commit_sector_updates(updates)
+                logger.info(f"市值前 {top_n} 名資料已成功合併寫入 '{self.collection_name}' 集合！")
+            except Exception as e:
+                logger.error(f"寫入市值資料到 Firestore 時發生錯誤: {e}")
+        return updates
 
-    def update_sector_details(self):
+    @profiled("sp500.update_sector_details")
+    def update_sector_details(self, sectors: list = None, commit: bool = True) -> dict:
         """
         遍歷所有已知的產業，更新其報告摘要、對應的 ETF 報酬率資料以及當日的 PE 值。
+
+        除了 'industry_data' 中既有的文件外，也會處理 sectors 中尚未建立文件的產業。
+        回傳 {產業: 欄位}；commit 為 False 時只計算不寫入。
         """
         if not self.db:
             logger.error("Firestore client 未初始化，無法執行。")
-            return
+            return {}
         SECTOR_ETF_MAP = {
             "Communication Services": "XLC",
             "Consumer Cyclical": "XLY",
@@ -109,13 +181,21 @@ class SP500DataUpdater:
         else:
             pe_map = {item.get('sector'): item.get('pe') for item in pe_snapshot}
 
+        updates = {}
         try:
-            docs = self.db.collection("industry_data").stream()
-            sectors = [doc.id for doc in docs]
-            
-            batch = self.db.batch()
-            for sector in sectors:
-                latest_report = get_latest_report(self.db, sector)
+            known_sectors = record_call(
+                "firestore", {"op": "list_industry_data"},
+                lambda: [doc.id for doc in self.db.collection("industry_data").stream()],
+            )
+            for sector in sectors or []:
+                if sector not in known_sectors:
+                    known_sectors.append(sector)
+
+            for sector in known_sectors:
+                latest_report = record_call(
+                    "firestore", {"op": "get_latest_report", "industry_name": sector},
+                    lambda: get_latest_report(self.db, sector),
+                )
                 preview_summary = latest_report.get('preview_summary', '') if latest_report else ''
                 etf_roi_data = {}
                 cleaned_sector = sector.strip()
@@ -145,104 +225,179 @@ class SP500DataUpdater:
                         doc_data['pe_low_1y'] = round(pe_low_1y, 2)
                 except Exception as e:
                     logger.error(f"為 sector '{sector}' 處理歷史 PE 時發生錯誤: {e}")
-                
-                doc_ref = self.db.collection("industry_data").document(sector)
-                batch.set(doc_ref, doc_data, merge=True)
 
-            batch.commit()
-            logger.info("產業詳細資料已成功合併寫入 'industry_data' 集合！")
+                updates[sector] = doc_data
+
+            if commit:
+                self._commit_sector_updates(updates)
+                logger.info("產業詳細資料已成功合併寫入 'industry_data' 集合！")
         except Exception as e:
             logger.error(f"更新產業詳細資料到 Firestore 時發生錯誤: {e}")
+        return updates
 
-    def update_sp500_etf_roi(self):
+    @profiled("sp500.update_sp500_etf_roi")
+    def update_sp500_etf_roi(self, commit: bool = True) -> dict:
         if not self.db:
             logger.error("Firestore client 未初始化，無法執行。")
-            return
+            return {}
+        updates = {}
         try:
             spy_roi_data = self.fmp_client.get_ETF_ROI("SPY")
             if spy_roi_data:
-                doc_ref = self.db.collection("industry_data").document("S&P 500")
-                doc_ref.set({"etf_roi": spy_roi_data}, merge=True)
-                logger.info("S&P 500 (SPY) ETF ROI 資料已成功合併寫入！")
+                updates["S&P 500"] = {"etf_roi": spy_roi_data}
+                if commit:
+                    self._commit_sector_updates(updates)
+                    logger.info("S&P 500 (SPY) ETF ROI 資料已成功合併寫入！")
             else:
                 logger.warning("無法獲取 SPY 的 ETF ROI 資料。")
         except Exception as e:
             logger.error(f"更新 S&P 500 (SPY) ETF ROI 時發生錯誤: {e}")
+        return updates
+
+    @profiled("sp500.update_market_breadth")
+    def update_market_breadth(self, stocks: list = None, commit: bool = True) -> dict:
+        """
+        計算每個產業的市場廣度指標（股價高於200日均線的公司佔比）。
+        成分股會分片交給多個行程查詢均線，再依產業加總各分片的家數。
 
-    def update_market_breadth(self):
-        """計算每個產業的市場廣度指標（股價高於200日均線的公司佔比）。"""
+        回傳 {產業: {"market_breadth_200d": ...}}；commit 為 False 時只計算不寫入。
+        """
         if not self.db:
             logger.error("Firestore client 未初始化，無法執行。")
-            return
-
-        logger.info("--- 開始更新市場廣度指標 (200日均線) ---")
+            return {}
 
-        # 1. 獲取 S&P 500 公司列表並按產業分組
-        sp500_stocks = self.fmp_client.get_sp500()
-        if not sp500_stocks:
-            logger.error("無法獲取 S&P 500 列表，任務終止。")
-            return
+        logger.info(f"--- 開始更新 {self.universe['name']} 市場廣度指標 (200日均線) ---")
 
-        stocks_by_sector = defaultdict(list)
-        for stock in sp500_stocks:
-            if stock.get('sector') and stock.get('symbol'):
-                stocks_by_sector[stock['sector']].append(stock['symbol'])
+        # 1. 獲取成分股列表
+        stocks = self._load_constituents(stocks)
+        if not stocks:
+            return {}
 
-        # 2. 遍歷每個產業，計算廣度指標
-        batch = self.db.batch()
-        for sector, symbols in stocks_by_sector.items():
-            if not symbols:
+        # 2. 分片計算各產業高於均線的家數並合併
+        shard_results = run_sharded(self.fmp_client, "market_breadth", stocks,
+                                    rate_share=self._shard_rate_share("market_breadth", stocks))
+        updates = {}
+        for sector, (above_sma_count, total_count, missing_count) in merge_market_breadth(shard_results).items():
+            missing_ratio = missing_count / (total_count + missing_count)
+            if missing_ratio > BREADTH_MAX_MISSING_RATIO:
+                logger.warning(f"產業 '{sector}' 有 {missing_count}/{total_count + missing_count} 家公司缺少均線資料，"
+                               f"超過 {BREADTH_MAX_MISSING_RATIO:.0%}，本次不更新其市場廣度指標。")
                 continue
+            if total_count > 0:
+                breadth_percentage = (above_sma_count / total_count) * 100
+                logger.info(f"產業 '{sector}' 的市場廣度指標: {above_sma_count}/{total_count} = {breadth_percentage:.2f}%")
+                updates[sector] = {"market_breadth_200d": round(breadth_percentage, 1)}
 
-            above_sma_count = 0
-            total_count = len(symbols)
-            logger.info(f"正在處理產業: {sector} ({total_count} 家公司)")
-
-            for symbol in symbols:
-                try:
-                    indicator_data = self.fmp_client.get_sma(symbol)
-                    logger.info(f"  - {symbol}: Indicator data: {indicator_data}") # Log indicator data
-
-                    if indicator_data:
-                        current_price = indicator_data.get('close')
-                        sma_200 = indicator_data.get('sma')
-                        logger.info(f"    - Price: {current_price}, SMA(200): {sma_200}") # Log price and SMA
-
-                        if current_price is not None and sma_200 is not None:
-                            if current_price > sma_200:
-                                above_sma_count += 1
-                    time.sleep(0.1)
+        if commit:
+            try:
+                self._commit_sector_updates(updates)
+                logger.info(f"市場廣度指標已成功合併寫入 '{self.collection_name}' 集合！")
+            except Exception as e:
+                logger.error(f"寫入市場廣度指標到 Firestore 時發生錯誤: {e}")
+        return updates
 
-                except Exception as e:
-                    logger.error(f"處理 {symbol} 時發生錯誤: {e}")
+    def build_task_graph(self) -> TaskGraph:
+        """
+        建立每日更新的任務相依圖。成分股只抓取一次，
+        其餘任務彼此獨立、可平行執行，且都只回傳欄位更新而不自行寫入。
+        """
+        graph = TaskGraph(max_workers=len(SECTOR_UPDATE_TASKS))
+        graph.add("constituents", lambda: load_constituents(self.fmp_client, self.universe_key))
+        graph.add(
+            "top10_by_market_cap",
+            lambda constituents: self.update_top10_by_market_cap_per_sector(constituents, commit=False),
+            deps=["constituents"],
+        )
+        # 只有 S&P 500 有產業報告摘要、ETF 報酬率、儀表板快照與歷史資料；其他指數只更新市場資料。
+        if self.universe_key == DEFAULT_UNIVERSE:
+            graph.add(
+                "sector_details",
+                lambda constituents: self.update_sector_details(
+                    sectors=sorted({stock['sector'] for stock in constituents or [] if stock.get('sector')}),
+                    commit=False,
+                ),
+                deps=["constituents"],
+            )
+            graph.add("sp500_etf_roi", lambda: self.update_sp500_etf_roi(commit=False))
+        graph.add(
+            "market_breadth",
+            lambda constituents: self.update_market_breadth(constituents, commit=False),
+            deps=["constituents"],
+        )
+        return graph
 
-            if total_count > 0:
-                breadth_percentage = (above_sma_count / total_count) * 100
-                logger.info(f"產業 '{sector}' 的市場廣度指標: {above_sma_count}/{total_count} = {breadth_percentage:.2f}%") # Log final calculation
+    def update_all_industry_data(self, tasks: list = None):
+        """
+        執行所有產業資料的更新任務。
 
-                doc_ref = self.db.collection("industry_data").document(sector)
-                batch.set(doc_ref, {"market_breadth_200d": round(breadth_percentage, 1)}, merge=True)
+        tasks 可指定只執行部分任務（其相依任務會一併執行）。所有任務完成後，
+        每個產業文件的欄位更新合併為一次批次寫入。
+        """
+        if not self.db:
+            logger.error("Firestore client 未初始化，無法執行。")
+            return
 
+        logger.info(f"=== 開始全面更新 {self.universe['name']} 產業資料 ===")
+        graph = self.build_task_graph()
+        self._planned_shard_tasks = [SHARDED_TASKS[name] for name in graph.resolve(tasks) if name in SHARDED_TASKS]
+        try:
+            results = graph.run(tasks)
+        finally:
+            self._planned_shard_tasks = []
+        updates = merge_sector_updates(results.get(name) for name in SECTOR_UPDATE_TASKS)
+        if not updates:
+            logger.warning("沒有任何產業資料需要更新。")
+            return
+        if is_replaying():
+            # 重播只用於離線重現與比對，不寫入產業資料、歷史與快照，也不發布更新事件。
+            logger.info(f"重播模式：已計算 {len(updates)} 份產業文件的更新，不寫入 Firestore 也不發布事件。")
+            return
         try:
-            batch.commit()
-            logger.info("市場廣度指標已成功合併寫入 'industry_data' 集合！")
+            self._commit_sector_updates(updates)
+            logger.info(f"已將 {len(updates)} 份產業文件以單一批次合併寫入 '{self.collection_name}' 集合！")
         except Exception as e:
-            logger.error(f"寫入市場廣度指標到 Firestore 時發生錯誤: {e}")
+            logger.error(f"寫入產業資料到 Firestore 時發生錯誤: {e}")
+            return
+        version = self.publish_daily_views(updates) if self.universe_key == DEFAULT_UNIVERSE else None
+        publish(INDUSTRY_DATA_UPDATED, universe=self.universe_key, sectors=sorted(updates), snapshot_version=version)
+        logger.info("=== 所有產業資料更新完畢 ===")
 
-    def update_all_industry_data(self):
+    def publish_daily_views(self, updates: dict):
         """
-        執行所有產業資料的更新任務。
+        讀取更新後的所有產業文件，發布給 /api/industry-data 直接回傳的儀表板快照，
+        並將本次實際更新的指標附加到各產業的歷史資料。
+
+        歷史資料只取自 updates：失敗或未執行的任務對應的欄位留空，
+        不會把文件中前一天的舊值當成今天的數據寫入。
         """
-        logger.info("=== 開始全面更新產業資料 ===")
-        self.update_top10_by_market_cap_per_sector()
-        self.update_sector_details()
-        self.update_sp500_etf_roi()
-        self.update_market_breadth()
-        logger.info("=== 所有產業資料更新完畢 ===")
+        try:
+            docs = self.db.collection("industry_data").stream()
+            rows = [build_industry_data_row(doc.id, doc.to_dict()) for doc in docs]
+        except Exception as e:
+            logger.error(f"讀取產業資料以建立儀表板快照時發生錯誤: {e}")
+            return None
+        history_rows = [build_industry_data_row(sector, fields) for sector, fields in updates.items()]
+        append_industry_history(self.db, history_rows, date.today().strftime('%Y-%m-%d'))
+        return publish_dashboard_snapshot(self.db, rows)
+
+# 各 update_* 步驟在 TaskGraph 的執行緒中各自產生 profile，整體任務只記錄時間。
+@profiled("job.run_sp500_update", profile=False)
+def run_sp500_update(tasks: list = None, universe: str = DEFAULT_UNIVERSE):
+    updater = SP500DataUpdater(universe=universe)
+    updater.update_all_industry_data(tasks)
 
-def run_sp500_update():
-    updater = SP500DataUpdater()
-    updater.update_all_industry_data()
+def run_extra_universe_updates():
+    """更新 MARKET_UNIVERSES (以逗號分隔，例如 "nasdaq100,sp400") 中 S&P 500 以外的指數。"""
+    for universe in os.getenv("MARKET_UNIVERSES", "").split(","):
+        universe = universe.strip()
+        if universe and universe != DEFAULT_UNIVERSE:
+            run_sp500_update(universe=universe)
 
 if __name__ == '__main__':
-    run_sp500_update()
\ No newline at end of file
+    # 例如 `python sp500_sector.py market_breadth` 只重新執行市場廣度任務，
+    # `python sp500_sector.py --universe nasdaq100` 更新 Nasdaq-100 的產業資料
+    parser = argparse.ArgumentParser(description="更新產業資料")
+    parser.add_argument("tasks", nargs="*", help="只執行指定的任務")
+    parser.add_argument("--universe", default=DEFAULT_UNIVERSE, choices=list(UNIVERSES))
+    args = parser.parse_args()
+    run_sp500_update(args.tasks or None, universe=args.universe)
\ No newline at end of file
@@ -0,0 +1,81 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TaskGraph:
+    """
+    A small dependency graph of named tasks.
+
+    Each task is called with the results of its dependencies as keyword
+    arguments. ``run`` executes independent tasks in parallel on a thread
+    pool; a task whose dependency failed is skipped.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._tasks = {}
+
+    def add(self, name: str, fn: Callable, deps: Iterable[str] = ()):
+        deps = tuple(deps)
+        for dep in deps:
+            if dep not in self._tasks:
+                raise ValueError(f"Task '{name}' depends on unknown task '{dep}'.")
+        self._tasks[name] = (fn, deps)
+
+    @property
+    def names(self) -> list:
+        return list(self._tasks)
+
+    def resolve(self, targets: Optional[Iterable[str]] = None) -> list:
+        """Returns the targets plus everything they depend on, in registration order."""
+        if targets is None:
+            return self.names
+        needed = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in self._tasks:
+                raise ValueError(f"Unknown task '{name}'. Available tasks: {', '.join(self._tasks)}")
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self._tasks[name][1])
+        return [name for name in self._tasks if name in needed]
+
+    def run(self, targets: Optional[Iterable[str]] = None) -> dict:
+        """
+        Runs the selected tasks and returns a dict of task name to result.
+        Failed and skipped tasks are absent from the result.
+        """
+        order = self.resolve(targets)
+        results = {}
+        failed = set()
+        remaining = list(order)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while remaining or running:
+                for name in list(remaining):
+                    fn, deps = self._tasks[name]
+                    if any(dep in failed for dep in deps):
+                        logger.warning(f"Task '{name}' skipped because a dependency failed.")
+                        failed.add(name)
+                        remaining.remove(name)
+                    elif all(dep in results for dep in deps):
+                        kwargs = {dep: results[dep] for dep in deps}
+                        running[executor.submit(fn, **kwargs)] = name
+                        remaining.remove(name)
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        logger.error(f"Task '{name}' failed: {e}")
+                        failed.add(name)
+        return results
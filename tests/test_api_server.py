@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import asyncio
+import json
+import os
+
+# Add the parent directory to the path so that we can import the api_server module
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_server
+from event_bus import INDUSTRY_DATA_UPDATED
+from firestore_service import DASHBOARD_SNAPSHOT_SCHEMA
+
+def make_snapshot(version, rows):
+    return {"schema": DASHBOARD_SNAPSHOT_SCHEMA, "version": version, "payload": json.dumps({"data": rows})}
+
+def make_request(headers=None):
+    request = MagicMock()
+    request.headers = headers or {}
+    return request
+
+class TestIndustryDataSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        """Start every test with an empty snapshot cache and a mock Firestore client."""
+        patchers = [
+            patch.dict(api_server._snapshot_cache, {"version": None, "body": None, "checked_at": 0.0}),
+            patch('api_server.db', MagicMock()),
+            patch('api_server.SNAPSHOT_CACHE_TTL', 60.0),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_industry_data(self, headers=None):
+        return asyncio.run(api_server.get_all_industry_data(make_request(headers)))
+
+    @patch('api_server.get_dashboard_snapshot')
+    def test_snapshot_hit_is_cached(self, mock_get_dashboard_snapshot):
+        """The pre-serialized snapshot is returned as-is and re-read only after the TTL."""
+        mock_get_dashboard_snapshot.return_value = make_snapshot(1, [{"industry_name": "Energy"}])
+
+        first = self.get_industry_data()
+        second = self.get_industry_data()
+
+        self.assertEqual(json.loads(first.body), {"data": [{"industry_name": "Energy"}]})
+        self.assertEqual(first.headers["ETag"], '"1"')
+        self.assertEqual(second.body, first.body)
+        mock_get_dashboard_snapshot.assert_called_once()
+
+    @patch('api_server.get_dashboard_snapshot')
+    def test_update_event_reloads_new_version(self, mock_get_dashboard_snapshot):
+        """An industry_data.updated event expires the cache so the next request serves the new version."""
+        mock_get_dashboard_snapshot.return_value = make_snapshot(1, [{"industry_name": "Energy", "pe_today": 10}])
+        self.get_industry_data()
+
+        mock_get_dashboard_snapshot.return_value = make_snapshot(2, [{"industry_name": "Energy", "pe_today": 11}])
+        self.assertEqual(self.get_industry_data().headers["ETag"], '"1"')
+
+        api_server._handle_event({"type": INDUSTRY_DATA_UPDATED})
+        response = self.get_industry_data()
+
+        self.assertEqual(response.headers["ETag"], '"2"')
+        self.assertEqual(json.loads(response.body)["data"][0]["pe_today"], 11)
+        self.assertEqual(mock_get_dashboard_snapshot.call_count, 2)
+
+    def test_schema_mismatch_falls_back_to_documents(self):
+        """A snapshot with an unknown schema is ignored and the response is built from industry_data."""
+        snapshot_doc = api_server.db.collection.return_value.document.return_value.get.return_value
+        snapshot_doc.exists = True
+        snapshot_doc.to_dict.return_value = {**make_snapshot(1, []), "schema": DASHBOARD_SNAPSHOT_SCHEMA + 1}
+        industry_doc = MagicMock(id="Energy")
+        industry_doc.to_dict.return_value = {"pe_today": 12.3, "market_breadth_200d": 41.26}
+        api_server.db.collection.return_value.stream.return_value = [industry_doc]
+
+        response = self.get_industry_data()
+
+        self.assertEqual(len(response["data"]), 1)
+        self.assertEqual(response["data"][0]["industry_name"], "Energy")
+        self.assertEqual(response["data"][0]["market_breadth_200d"], 41.3)
+        api_server.db.collection.assert_any_call("industry_data")
+
+    @patch('api_server.get_dashboard_snapshot')
+    def test_if_none_match_returns_304(self, mock_get_dashboard_snapshot):
+        """Clients holding the current version get 304 Not Modified without a body."""
+        mock_get_dashboard_snapshot.return_value = make_snapshot(7, [])
+
+        response = self.get_industry_data({"if-none-match": '"7"'})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], '"7"')
+        self.assertEqual(response.body, b"")
+        self.assertEqual(self.get_industry_data({"if-none-match": '"6"'}).status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
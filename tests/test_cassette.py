@@ -0,0 +1,103 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import tempfile
+
+# Add the parent directory to the path so that we can import the cassette module
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cassette
+from cassette import Cassette, CassetteMiss
+
+class TestCassette(unittest.TestCase):
+
+    def setUp(self):
+        """Create a temporary archive path for each test."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "run.jsonl.gz")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_record_then_replay(self):
+        """Recorded responses are replayed in order without calling the live service."""
+        recorder = Cassette(self.path, "record")
+        fetch = MagicMock(side_effect=[{"price": 1}, {"price": 2}])
+        request = {"endpoint": "stable/batch-quote", "params": {"symbols": "AAPL"}}
+        self.assertEqual(recorder.call("fmp", request, fetch), {"price": 1})
+        self.assertEqual(recorder.call("fmp", request, fetch), {"price": 2})
+
+        player = Cassette(self.path, "replay")
+        live = MagicMock()
+        self.assertEqual(player.call("fmp", request, live), {"price": 1})
+        self.assertEqual(player.call("fmp", request, live), {"price": 2})
+        live.assert_not_called()
+
+        # All recorded responses for this request have been consumed
+        with self.assertRaises(CassetteMiss):
+            player.call("fmp", request, live)
+
+    def test_replay_ignores_dates_in_request(self):
+        """Requests recorded on one day still match when replayed on another."""
+        recorder = Cassette(self.path, "record")
+        recorder.call("gemini", {"prompt": "Technology 2025-10-27"}, lambda: "events")
+
+        player = Cassette(self.path, "replay")
+        self.assertEqual(player.call("gemini", {"prompt": "Technology 2025-11-03"}, MagicMock()), "events")
+
+    @patch('cassette.time.sleep')
+    def test_replay_latency(self, mock_sleep):
+        """Original latencies are reproduced only when requested."""
+        recorder = Cassette(self.path, "record")
+        recorder.call("fmp", {"endpoint": "a"}, lambda: [1])
+
+        Cassette(self.path, "replay").call("fmp", {"endpoint": "a"}, MagicMock())
+        mock_sleep.assert_not_called()
+
+        Cassette(self.path, "replay", replay_latency=True).call("fmp", {"endpoint": "a"}, MagicMock())
+        mock_sleep.assert_called_once()
+
+    def test_new_recording_replaces_old_one(self):
+        """Re-recording to the same path replays the latest run, not the first."""
+        request = {"endpoint": "stable/batch-quote"}
+        Cassette(self.path, "record", truncate=True).call("fmp", request, lambda: {"price": 1})
+        Cassette(self.path, "record", truncate=True).call("fmp", request, lambda: {"price": 2})
+
+        self.assertEqual(Cassette(self.path, "replay").call("fmp", request, MagicMock()), {"price": 2})
+
+    def test_active_cassette_truncates_in_main_process(self):
+        """The environment-configured recorder starts a fresh archive in the main process."""
+        Cassette(self.path, "record").call("fmp", {"endpoint": "old"}, lambda: [0])
+        env = {"CASSETTE_MODE": "record", "CASSETTE_PATH": self.path}
+        with patch.dict(os.environ, env), patch.object(cassette, "_active_cassette", None):
+            cassette.get_active_cassette().call("fmp", {"endpoint": "new"}, lambda: [1])
+
+        player = Cassette(self.path, "replay")
+        with self.assertRaises(CassetteMiss):
+            player.call("fmp", {"endpoint": "old"}, MagicMock())
+        self.assertEqual(player.call("fmp", {"endpoint": "new"}, MagicMock()), [1])
+
+    def test_record_call_replays_recorded_reads(self):
+        """record_call goes through the active cassette and calls fetch directly without one."""
+        request = {"op": "get_latest_report", "industry_name": "Energy"}
+        with patch.dict(os.environ, {"CASSETTE_MODE": "record", "CASSETTE_PATH": self.path}), \
+                patch.object(cassette, "_active_cassette", None):
+            self.assertFalse(cassette.is_replaying())
+            self.assertEqual(cassette.record_call("firestore", request, lambda: {"title": "old"}), {"title": "old"})
+
+        with patch.dict(os.environ, {"CASSETTE_MODE": "replay", "CASSETTE_PATH": self.path}), \
+                patch.object(cassette, "_active_cassette", None):
+            self.assertTrue(cassette.is_replaying())
+            self.assertEqual(cassette.record_call("firestore", request, MagicMock()), {"title": "old"})
+
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(cassette.record_call("firestore", request, lambda: None), None)
+
+    def test_active_cassette_disabled_by_default(self):
+        """No cassette is active unless CASSETTE_MODE is set."""
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(cassette.get_active_cassette())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import asyncio
+import json
+import os
+
+# Add the parent directory to the path so that we can import the event_bus module
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_bus import INDUSTRY_DATA_UPDATED, EventBroker, format_sse, publish, start_listener
+
+class TestEventBus(unittest.TestCase):
+
+    def test_format_sse(self):
+        """Events are framed as SSE messages with an id, event name and JSON data."""
+        event = {"type": INDUSTRY_DATA_UPDATED, "data": {"sectors": ["Energy"]}, "published_at": 1}
+        message = format_sse(event)
+
+        self.assertTrue(message.startswith("id: 1\nevent: industry_data.updated\ndata: "))
+        self.assertTrue(message.endswith("\n\n"))
+        self.assertEqual(json.loads(message.split("data: ", 1)[1]), event)
+
+    def test_broker_drops_events_for_full_queues_only(self):
+        """A slow subscriber does not prevent others from receiving events."""
+        async def scenario():
+            broker = EventBroker(queue_size=1)
+            slow = broker.subscribe()
+            fast = broker.subscribe()
+            broker.publish_local({"type": "a"})
+            await fast.get()
+            broker.publish_local({"type": "b"})
+            self.assertEqual((await slow.get())["type"], "a")
+            self.assertEqual((await fast.get())["type"], "b")
+            broker.unsubscribe(slow)
+            self.assertEqual(broker.subscriber_count, 1)
+
+        asyncio.run(scenario())
+
+    def test_publish_reaches_listener(self):
+        """Events published by a job are delivered to the API server's listener."""
+        async def scenario():
+            received = asyncio.Queue()
+            transport = await start_listener(received.put_nowait, address="127.0.0.1:0")
+            port = transport.get_extra_info("sockname")[1]
+            try:
+                self.assertTrue(publish(INDUSTRY_DATA_UPDATED, address=f"127.0.0.1:{port}", sectors=["Energy"]))
+                event = await asyncio.wait_for(received.get(), timeout=5)
+            finally:
+                transport.close()
+            self.assertEqual(event["type"], INDUSTRY_DATA_UPDATED)
+            self.assertEqual(event["data"], {"sectors": ["Energy"]})
+
+        asyncio.run(scenario())
+
+if __name__ == '__main__':
+    unittest.main()
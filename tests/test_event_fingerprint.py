@@ -0,0 +1,46 @@
+import unittest
+import json
+import os
+
+# Add the parent directory to the path so that we can import the event_fingerprint module
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_fingerprint import build_fingerprint, parse_events, similarity
+
+def make_events(*urls):
+    return json.dumps([{"title": f"Event {i}", "source_url": url} for i, url in enumerate(urls)])
+
+class TestEventFingerprint(unittest.TestCase):
+
+    def test_parse_events(self):
+        """Stage-1 output is parsed even when wrapped in a code fence."""
+        self.assertEqual(parse_events('```json\n[{"title": "A"}]\n```'), [{"title": "A"}])
+        self.assertIsNone(parse_events("not json"))
+        self.assertIsNone(parse_events('{"title": "A"}'))
+
+    def test_fingerprint_ignores_wording_and_tracking_params(self):
+        """The same events with reworded titles and tracking parameters produce the same fingerprint."""
+        this_week = json.dumps([
+            {"title": "Fed holds rates", "source_url": "https://www.reuters.com/markets/fed/?utm_source=x"},
+            {"title": "OPEC+ cuts output", "source_url": "https://www.cnbc.com/opec"},
+        ])
+        last_week = json.dumps([
+            {"title": "OPEC+ 減產", "source_url": "https://cnbc.com/opec/"},
+            {"title": "聯準會按兵不動", "source_url": "https://reuters.com/markets/fed"},
+        ])
+
+        self.assertEqual(build_fingerprint(this_week)["hash"], build_fingerprint(last_week)["hash"])
+        self.assertEqual(similarity(build_fingerprint(this_week), build_fingerprint(last_week)), 1.0)
+
+    def test_similarity(self):
+        """Similarity is the Jaccard index of the event sets."""
+        a = build_fingerprint(make_events("https://a.com/1", "https://a.com/2", "https://a.com/3"))
+        b = build_fingerprint(make_events("https://a.com/1", "https://a.com/2", "https://a.com/4"))
+
+        self.assertAlmostEqual(similarity(a, b), 0.5)
+        self.assertEqual(similarity(a, None), 0.0)
+        self.assertIsNone(build_fingerprint("[]"))
+
+if __name__ == '__main__':
+    unittest.main()
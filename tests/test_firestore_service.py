@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import MagicMock
+import json
+import os
+
+# Add the parent directory to the path so that we can import the firestore_service module
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from firestore_service import (
+    DASHBOARD_SNAPSHOT_SCHEMA,
+    get_dashboard_snapshot,
+    publish_dashboard_snapshot,
+)
+
+def make_snapshot_db(snapshot=None):
+    """Returns a mock Firestore client whose snapshot document holds the given data."""
+    db = MagicMock()
+    doc = db.collection.return_value.document.return_value.get.return_value
+    doc.exists = snapshot is not None
+    doc.to_dict.return_value = snapshot
+    return db
+
+class TestDashboardSnapshot(unittest.TestCase):
+
+    def test_publish_dashboard_snapshot(self):
+        """The full response is serialized once into a versioned snapshot document."""
+        db = MagicMock()
+        rows = [{"industry_name": "Energy", "pe_today": 12.3}]
+
+        version = publish_dashboard_snapshot(db, rows)
+
+        db.collection.assert_called_once_with("dashboard_snapshots")
+        db.collection.return_value.document.assert_called_once_with("industry_data")
+        written = db.collection.return_value.document.return_value.set.call_args.args[0]
+        self.assertEqual(written["schema"], DASHBOARD_SNAPSHOT_SCHEMA)
+        self.assertEqual(written["version"], version)
+        self.assertEqual(json.loads(written["payload"]), {"data": rows})
+
+    def test_get_dashboard_snapshot(self):
+        """Snapshots are returned only when they exist and match the current schema."""
+        snapshot = {"schema": DASHBOARD_SNAPSHOT_SCHEMA, "version": 1, "payload": '{"data": []}'}
+        self.assertEqual(get_dashboard_snapshot(make_snapshot_db(snapshot)), snapshot)
+
+        self.assertIsNone(get_dashboard_snapshot(make_snapshot_db(None)))
+        self.assertIsNone(get_dashboard_snapshot(make_snapshot_db({**snapshot, "schema": DASHBOARD_SNAPSHOT_SCHEMA + 1})))
+        self.assertIsNone(get_dashboard_snapshot(make_snapshot_db({**snapshot, "payload": ""})))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+from unittest.mock import patch
+import os
+import datetime
+import json
+import tempfile
+
+# Add the parent directory to the path so that we can import the main module
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cassette
+from cassette import Cassette
+from main import Main
+from event_fingerprint import build_fingerprint
+
+SECTOR = {"sector": "Technology"}
+TODAY = datetime.date(2025, 11, 3)
+
+def make_events(*ids):
+    return json.dumps([{"title": f"Event {i}", "source_url": f"https://news.com/{i}"} for i in ids])
+
+def make_previous_report(*ids, **fields):
+    report = {
+        "title": "{'sector': 'Technology'} 產業週報 2025-10-27",
+        "report_part_1": "Part 1",
+        "report_part_2": "Part 2",
+        "preview_summary": "Summary",
+        "events_fingerprint": build_fingerprint(make_events(*ids)),
+    }
+    report.update(fields)
+    return report
+
+@patch('main.MAX_REPORT_REUSE_STREAK', 2)
+@patch('main.REPORT_REUSE_THRESHOLD', 0.8)
+class TestReusePreviousReport(unittest.TestCase):
+
+    @patch('main.ReportGenerator')
+    @patch('main.FMPClient')
+    def setUp(self, mock_fmp_client, mock_report_generator):
+        """Set up a Main instance with mock clients."""
+        self.main = Main()
+
+    def reuse(self, json_data, previous_report):
+        return self.main.reuse_previous_report(SECTOR, TODAY, json_data, build_fingerprint(json_data), previous_report)
+
+    def test_below_threshold_is_not_reused(self):
+        """A report whose events overlap less than the threshold is regenerated."""
+        # Jaccard similarity 3/5 = 0.6
+        self.assertIsNone(self.reuse(make_events(1, 2, 3, 5), make_previous_report(1, 2, 3, 4)))
+
+    def test_at_threshold_is_reused(self):
+        """A similarity equal to the threshold reuses the previous report's content."""
+        # Jaccard similarity 4/5 = 0.8
+        json_data = make_events(1, 2, 3, 4, 5)
+        previous_report = make_previous_report(1, 2, 3, 4)
+
+        report = self.reuse(json_data, previous_report)
+
+        self.assertEqual(report["report_part_1"], "Part 1")
+        self.assertEqual(report["report_part_2"], "Part 2")
+        self.assertEqual(report["preview_summary"], "Summary")
+        self.assertEqual(report["source_events_json"], json_data)
+        self.assertEqual(report["reused_from"], previous_report["title"])
+        self.assertEqual(report["reuse_similarity"], 0.8)
+        self.assertEqual(report["reuse_streak"], 1)
+        self.assertIn("2025-11-03", report["title"])
+
+    def test_exhausted_streak_is_not_reused(self):
+        """After MAX_REPORT_REUSE_STREAK reuses in a row the report is regenerated."""
+        json_data = make_events(1, 2, 3, 4)
+        self.assertEqual(self.reuse(json_data, make_previous_report(1, 2, 3, 4, reuse_streak=1))["reuse_streak"], 2)
+        self.assertIsNone(self.reuse(json_data, make_previous_report(1, 2, 3, 4, reuse_streak=2)))
+
+    def test_previous_report_without_part_1_is_not_reused(self):
+        """A previous report with no body is never reused, even for identical events."""
+        json_data = make_events(1, 2, 3, 4)
+        self.assertIsNone(self.reuse(json_data, make_previous_report(1, 2, 3, 4, report_part_1="")))
+        self.assertIsNone(self.reuse(json_data, None))
+
+class TestGetPreviousReport(unittest.TestCase):
+
+    @patch('main.ReportGenerator')
+    @patch('main.FMPClient')
+    def test_replay_uses_recorded_previous_report(self, mock_fmp_client, mock_report_generator):
+        """During replay the previous report comes from the cassette, not from Firestore."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "run.jsonl.gz")
+            previous_report = make_previous_report(1, 2, 3, 4)
+            request = {"op": "get_latest_report", "industry_name": "Technology"}
+            Cassette(path, "record").call("firestore", request, lambda: previous_report)
+
+            env = {"CASSETTE_MODE": "replay", "CASSETTE_PATH": path}
+            with patch.dict(os.environ, env), patch.object(cassette, "_active_cassette", None), \
+                    patch('main.get_latest_report') as mock_get_latest_report:
+                self.assertEqual(Main().get_previous_report("Technology"), previous_report)
+            mock_get_latest_report.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+from unittest.mock import patch
+import json
+import os
+import tempfile
+import threading
+
+# Add the parent directory to the path so that we can import the profiling module
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profiling import (
+    PER_THREAD_PROFILERS,
+    finish_request_timing,
+    format_server_timing,
+    profiled,
+    start_request_timing,
+    timed,
+)
+from task_graph import TaskGraph
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _runs(self):
+        with open(os.path.join(self.tmp_dir.name, "runs.jsonl"), encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_disabled_by_default(self):
+        """Without PROFILE_JOBS the wrapped function runs and nothing is written."""
+        with patch.dict(os.environ, {"PROFILE_DIR": self.tmp_dir.name}, clear=True):
+            self.assertEqual(profiled("job")(lambda: 42)(), 42)
+        self.assertEqual(os.listdir(self.tmp_dir.name), [])
+
+    def test_profiled_run_writes_stats(self):
+        """Each profiled run saves pstats output and a wall/CPU summary line."""
+        @profiled("job.outer")
+        def outer():
+            return inner() + 1
+
+        @profiled("step.inner")
+        def inner():
+            return sum(range(1000))
+
+        with patch.dict(os.environ, {"PROFILE_JOBS": "1", "PROFILE_DIR": self.tmp_dir.name}):
+            self.assertEqual(outer(), 499501)
+
+        runs = {run["name"]: run for run in self._runs()}
+        self.assertEqual(set(runs), {"job.outer", "step.inner"})
+        self.assertTrue(os.path.exists(runs["job.outer"]["profile"]))
+        # The nested call on the same thread records timings without its own profiler
+        self.assertNotIn("profile", runs["step.inner"])
+        for run in runs.values():
+            self.assertEqual(run["status"], "ok")
+            self.assertGreaterEqual(run["wall_s"], 0)
+
+    def test_steps_on_task_graph_threads_are_profiled(self):
+        """Steps run in parallel by TaskGraph under a timings-only job each write a profile."""
+        barrier = threading.Barrier(2)
+
+        @profiled("step.parallel")
+        def step():
+            barrier.wait(timeout=5)
+            return sum(range(1000))
+
+        @profiled("job.graph", profile=False)
+        def job():
+            graph = TaskGraph(max_workers=2)
+            graph.add("a", step)
+            graph.add("b", step)
+            return graph.run()
+
+        with patch.dict(os.environ, {"PROFILE_JOBS": "1", "PROFILE_DIR": self.tmp_dir.name}):
+            self.assertEqual(job(), {"a": 499500, "b": 499500})
+
+        runs = self._runs()
+        steps = [run for run in runs if run["name"] == "step.parallel"]
+        self.assertEqual([run["status"] for run in runs], ["ok", "ok", "ok"])
+        self.assertNotIn("profile", next(run for run in runs if run["name"] == "job.graph"))
+        # Before 3.12 each thread has its own profiler; from 3.12 only one can be active
+        expected_profiles = 2 if PER_THREAD_PROFILERS else 1
+        self.assertEqual(sum("profile" in run for run in steps), expected_profiles)
+
+    def test_profiled_records_errors(self):
+        """Failures are re-raised and recorded with an error status."""
+        @profiled("job.failing")
+        def failing():
+            raise RuntimeError("boom")
+
+        with patch.dict(os.environ, {"PROFILE_JOBS": "1", "PROFILE_DIR": self.tmp_dir.name}):
+            with self.assertRaises(RuntimeError):
+                failing()
+        self.assertEqual(self._runs()[0]["status"], "error")
+
+    def test_request_timings(self):
+        """timed() only accumulates while a request is being sampled."""
+        with timed("firestore"):
+            pass
+
+        token = start_request_timing()
+        with timed("firestore"):
+            pass
+        with timed("firestore"):
+            pass
+        timings = finish_request_timing(token)
+
+        self.assertEqual(list(timings), ["firestore"])
+        header = format_server_timing({"firestore": 0.0123}, 0.05)
+        self.assertEqual(header, "firestore;dur=12.3, total;dur=50.0")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+
+# Add the parent directory to the path so that we can import the rate_limiter module
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import (
+    AIMDLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+    RateController,
+    TokenBucket,
+    parse_retry_after,
+)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def make_response(status_code, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return response
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_parse_retry_after(self):
+        """Retry-After accepts both delta-seconds and HTTP dates."""
+        self.assertEqual(parse_retry_after("5"), 5.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:10 GMT", now=1445412480.0), 10.0)
+
+    def test_token_bucket_throttles_to_rate(self):
+        """Once the burst is spent, tokens are handed out at the configured rate."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2.0, capacity=2, clock=clock, sleep=clock.sleep)
+        for _ in range(6):
+            bucket.acquire()
+        self.assertAlmostEqual(clock.now, 2.0)
+
+    def test_token_bucket_set_rate(self):
+        """Lowering the rate takes effect for the tokens handed out afterwards."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2.0, capacity=2, clock=clock, sleep=clock.sleep)
+        bucket.set_rate(rate=1.0, capacity=1)
+        for _ in range(3):
+            bucket.acquire()
+        self.assertAlmostEqual(clock.now, 2.0)
+
+    def test_token_bucket_pause(self):
+        """A pause (e.g. from Retry-After) delays the next acquire."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10.0, capacity=10, clock=clock, sleep=clock.sleep)
+        bucket.pause_for(3.0)
+        bucket.acquire()
+        self.assertGreaterEqual(clock.now, 3.0)
+
+    def test_aimd_limiter(self):
+        """Throttles halve the concurrency limit and successes grow it back."""
+        limiter = AIMDLimiter(initial=8, maximum=8)
+        limiter.on_throttle()
+        self.assertEqual(limiter.limit, 4)
+        for _ in range(5):
+            limiter.on_success()
+        self.assertEqual(limiter.limit, 5)
+
+    def test_circuit_breaker(self):
+        """The breaker opens after repeated failures and half-opens after the timeout."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        clock.now += 30
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_controller_retries_throttled_responses(self):
+        """A 429 is retried instead of being returned as a failure."""
+        clock = FakeClock()
+        controller = RateController(requests_per_minute=600, max_concurrency=4, sleep=clock.sleep)
+        controller.bucket = TokenBucket(rate=10.0, capacity=10, clock=clock, sleep=clock.sleep)
+        send = MagicMock(side_effect=[make_response(429, {"Retry-After": "2"}), make_response(200)])
+
+        response = controller.execute("stable/batch-quote", send)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(send.call_count, 2)
+        self.assertGreaterEqual(clock.now, 2.0)
+        self.assertEqual(controller.concurrency.limit, 2)
+
+    def test_controller_opens_circuit(self):
+        """Endpoints that keep failing are short-circuited."""
+        clock = FakeClock()
+        controller = RateController(max_retries=0, failure_threshold=2, sleep=clock.sleep)
+        send = MagicMock(return_value=make_response(503))
+
+        controller.execute("stable/sector-pe-snapshot", send)
+        controller.execute("stable/sector-pe-snapshot", send)
+        with self.assertRaises(CircuitOpenError):
+            controller.execute("stable/sector-pe-snapshot", send)
+        self.assertEqual(send.call_count, 2)
+
+        # Other endpoints have their own breaker
+        send_ok = MagicMock(return_value=make_response(200))
+        self.assertEqual(controller.execute("stable/batch-quote", send_ok).status_code, 200)
+
+    def test_unexpected_error_during_trial_releases_circuit(self):
+        """An exception outside retry_exceptions during the half-open trial does not wedge the breaker."""
+        controller = RateController(max_retries=0, failure_threshold=1, reset_timeout=0.0)
+        controller.execute("stable/batch-quote", MagicMock(return_value=make_response(503)))
+        self.assertEqual(controller.breaker("stable/batch-quote").state, CircuitBreaker.OPEN)
+
+        with self.assertRaises(ValueError):
+            controller.execute("stable/batch-quote", MagicMock(side_effect=ValueError("bad chunk")))
+        self.assertEqual(controller.breaker("stable/batch-quote").state, CircuitBreaker.OPEN)
+
+        send_ok = MagicMock(return_value=make_response(200))
+        self.assertEqual(controller.execute("stable/batch-quote", send_ok).status_code, 200)
+        self.assertEqual(controller.breaker("stable/batch-quote").state, CircuitBreaker.CLOSED)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import patch
+import gzip
+import json
+import os
+import tempfile
+
+# Add the parent directory to the path so that we can import the sp500_sector module
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cassette
+from profiling import PER_THREAD_PROFILERS
+from sp500_sector import run_sp500_update
+
+STOCKS = [
+    {"symbol": "AAPL", "sector": "Technology"},
+    {"symbol": "XOM", "sector": "Energy"},
+]
+
+class TestSP500Sector(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @unittest.skipUnless(PER_THREAD_PROFILERS, "cProfile allows one profiler per process from Python 3.12")
+    @patch('sp500_sector.publish')
+    @patch('sp500_sector.firestore.Client')
+    @patch('sp500_sector.FMPClient')
+    def test_profiled_job_writes_per_step_profiles(self, mock_fmp_client, mock_firestore_client, mock_publish):
+        """Under PROFILE_JOBS each update step run by the TaskGraph writes its own profile."""
+        fmp_client = mock_fmp_client.return_value
+        fmp_client.get_sp500.return_value = STOCKS
+        fmp_client.get_sma.return_value = {"close": 10, "sma": 5}
+        fmp_client.get_ETF_ROI.return_value = {"1y": 12.5}
+
+        env = {
+            "FMP_API_KEY": "fake_fmp_api_key",
+            "MARKET_DATA_WORKERS": "1",
+            "PROFILE_JOBS": "1",
+            "PROFILE_DIR": self.tmp_dir.name,
+        }
+        with patch.dict(os.environ, env):
+            run_sp500_update(["sp500_etf_roi", "market_breadth"])
+
+        with open(os.path.join(self.tmp_dir.name, "runs.jsonl"), encoding="utf-8") as f:
+            runs = {run["name"]: run for run in map(json.loads, f)}
+        for step in ("sp500.update_sp500_etf_roi", "sp500.update_market_breadth"):
+            self.assertEqual(runs[step]["status"], "ok")
+            self.assertTrue(os.path.exists(runs[step]["profile"]))
+        self.assertNotIn("profile", runs["job.run_sp500_update"])
+        mock_publish.assert_called_once()
+
+    @patch('sp500_sector.publish')
+    @patch('sp500_sector.firestore.Client')
+    @patch('sp500_sector.FMPClient')
+    def test_replay_does_not_write_or_publish(self, mock_fmp_client, mock_firestore_client, mock_publish):
+        """Replaying a run computes the updates without touching Firestore or the event bus."""
+        mock_fmp_client.return_value.get_ETF_ROI.return_value = {"1y": 12.5}
+        path = os.path.join(self.tmp_dir.name, "run.jsonl.gz")
+        with gzip.open(path, "wt", encoding="utf-8"):
+            pass
+
+        env = {"FMP_API_KEY": "fake_fmp_api_key", "CASSETTE_MODE": "replay", "CASSETTE_PATH": path}
+        with patch.dict(os.environ, env), patch.object(cassette, "_active_cassette", None):
+            run_sp500_update(["sp500_etf_roi"])
+
+        mock_fmp_client.return_value.get_ETF_ROI.assert_called_once_with("SPY")
+        mock_firestore_client.return_value.batch.assert_not_called()
+        mock_firestore_client.return_value.collection.assert_not_called()
+        mock_publish.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import os
+import threading
+
+# Add the parent directory to the path so that we can import the task_graph module
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_graph import TaskGraph
+
+class TestTaskGraph(unittest.TestCase):
+
+    def test_dependencies_receive_results(self):
+        """Each task is called with its dependencies' results as keyword arguments."""
+        graph = TaskGraph()
+        graph.add("symbols", lambda: ["AAPL", "MSFT"])
+        graph.add("count", lambda symbols: len(symbols), deps=["symbols"])
+
+        results = graph.run()
+
+        self.assertEqual(results, {"symbols": ["AAPL", "MSFT"], "count": 2})
+
+    def test_independent_tasks_run_in_parallel(self):
+        """Independent tasks start without waiting for each other."""
+        barrier = threading.Barrier(3, timeout=5)
+        graph = TaskGraph(max_workers=3)
+        for name in ("a", "b", "c"):
+            graph.add(name, barrier.wait)
+
+        results = graph.run()
+
+        self.assertEqual(set(results), {"a", "b", "c"})
+
+    def test_run_selected_task_with_dependencies(self):
+        """Running a single task also runs what it depends on, and nothing else."""
+        calls = []
+        graph = TaskGraph()
+        graph.add("constituents", lambda: calls.append("constituents") or [1])
+        graph.add("breadth", lambda constituents: calls.append("breadth"), deps=["constituents"])
+        graph.add("etf_roi", lambda: calls.append("etf_roi"))
+
+        graph.run(["breadth"])
+
+        self.assertEqual(sorted(calls), ["breadth", "constituents"])
+        with self.assertRaises(ValueError):
+            graph.run(["unknown"])
+
+    def test_failed_task_skips_dependents(self):
+        """A failing task does not stop unrelated tasks, but its dependents are skipped."""
+        def fail():
+            raise RuntimeError("boom")
+
+        graph = TaskGraph()
+        graph.add("constituents", fail)
+        graph.add("breadth", lambda constituents: "done", deps=["constituents"])
+        graph.add("etf_roi", lambda: "roi")
+
+        results = graph.run()
+
+        self.assertEqual(results, {"etf_roi": "roi"})
+
+if __name__ == '__main__':
+    unittest.main()
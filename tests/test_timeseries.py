@@ -0,0 +1,78 @@
+import unittest
+import os
+
+# Add the parent directory to the path so that we can import the timeseries module
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timeseries import (
+    append_point,
+    concat_histories,
+    downsample,
+    empty_history,
+    history_point,
+    slice_range,
+)
+
+class TestTimeseries(unittest.TestCase):
+
+    def test_history_point(self):
+        """The daily point pulls PE out of etf_roi and keeps only top-10 prices."""
+        row = {
+            "industry_name": "Technology",
+            "pe_today": None,
+            "etf_roi": {"1D": 0.5, "pe_today": 35.2},
+            "market_breadth_200d": 61.3,
+            "top_stocks": [{"symbol": "NVDA", "price": 180.1, "marketCap": 1}],
+        }
+
+        point = history_point(row)
+
+        self.assertEqual(point, {
+            "pe_today": 35.2,
+            "market_breadth_200d": 61.3,
+            "etf_roi": {"1D": 0.5},
+            "top_prices": {"NVDA": 180.1},
+        })
+
+    def test_append_point_keeps_columns_aligned(self):
+        """Points are inserted in date order and re-running a day overwrites it."""
+        history = empty_history("Technology", 2025)
+        append_point(history, "2025-10-10", {"pe_today": 2})
+        append_point(history, "2025-10-09", {"pe_today": 1})
+        append_point(history, "2025-10-10", {"pe_today": 3})
+
+        self.assertEqual(history["dates"], ["2025-10-09", "2025-10-10"])
+        self.assertEqual(history["pe_today"], [1, 3])
+        self.assertEqual(history["market_breadth_200d"], [None, None])
+
+    def test_append_point_keeps_values_not_updated_in_rerun(self):
+        """A partial re-run of a day only overwrites the columns it updated."""
+        history = empty_history("Technology", 2025)
+        append_point(history, "2025-10-10", {"pe_today": 30, "market_breadth_200d": 55.0})
+        append_point(history, "2025-10-10", {"pe_today": None, "market_breadth_200d": 60.0})
+
+        self.assertEqual(history["pe_today"], [30])
+        self.assertEqual(history["market_breadth_200d"], [60.0])
+
+    def test_range_across_years_and_downsample(self):
+        """Histories from two years are joined, sliced and downsampled keeping the latest point."""
+        older = empty_history("Energy", 2024)
+        newer = empty_history("Energy", 2025)
+        append_point(older, "2024-12-30", {"pe_today": 10})
+        append_point(older, "2024-12-31", {"pe_today": 11})
+        for day in range(1, 11):
+            append_point(newer, f"2025-01-{day:02d}", {"pe_today": 11 + day})
+
+        history = concat_histories([newer, older])
+        series = slice_range(history, "2024-12-31", "2025-01-10")
+        self.assertEqual(len(series["dates"]), 11)
+
+        sampled = downsample(series, 4)
+        self.assertLessEqual(len(sampled["dates"]), 4)
+        self.assertEqual(sampled["dates"][0], "2024-12-31")
+        self.assertEqual(sampled["dates"][-1], "2025-01-10")
+        self.assertEqual(sampled["pe_today"][-1], 21)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+
+# Add the parent directory to the path so that we can import the universe module
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from universe import (
+    BATCH_SIZE,
+    load_constituents,
+    merge_market_breadth,
+    merge_top_market_caps,
+    expected_requests,
+    parent_rate_share,
+    plan_rate_shares,
+    run_sharded,
+    shard_stocks,
+    top_market_caps_shard,
+)
+
+STOCKS = [
+    {"symbol": "AAPL", "sector": "Technology"},
+    {"symbol": "MSFT", "sector": "Technology"},
+    {"symbol": "NVDA", "sector": "Technology"},
+    {"symbol": "XOM", "sector": "Energy"},
+    {"symbol": "CVX", "sector": "Energy"},
+]
+
+class TestUniverse(unittest.TestCase):
+
+    def test_shard_stocks_is_balanced(self):
+        """Every stock lands in exactly one shard and shard sizes differ by at most one."""
+        shards = shard_stocks(STOCKS, 2)
+
+        self.assertEqual(len(shards), 2)
+        self.assertEqual(sorted(s["symbol"] for shard in shards for s in shard), sorted(s["symbol"] for s in STOCKS))
+        self.assertLessEqual(abs(len(shards[0]) - len(shards[1])), 1)
+        self.assertEqual(len(shard_stocks(STOCKS[:1], 8)), 1)
+
+    def test_market_cap_batches_do_not_depend_on_shard_count(self):
+        """The same market-cap batches are requested whatever the number of shards."""
+        stocks = [{"symbol": f"S{i:03d}", "sector": ["Energy", "Technology"][i % 2]} for i in range(250)]
+
+        def requested_batches(shard_count):
+            fmp_client = MagicMock()
+            fmp_client.get_market_caps_for_list.return_value = []
+            for shard in shard_stocks(stocks, shard_count, BATCH_SIZE):
+                top_market_caps_shard(fmp_client, shard, top_n=10)
+            return sorted(tuple(call.args[0]) for call in fmp_client.get_market_caps_for_list.call_args_list)
+
+        self.assertEqual(len(requested_batches(1)), 3)
+        self.assertEqual(requested_batches(1), requested_batches(2))
+        self.assertEqual(requested_batches(1), requested_batches(8))
+
+    def test_merge_shard_results(self):
+        """Per-shard results are merged per sector."""
+        top = merge_top_market_caps([
+            {"Technology": [{"symbol": "AAPL", "marketCap": 3}, {"symbol": "NVDA", "marketCap": 1}]},
+            {"Technology": [{"symbol": "MSFT", "marketCap": 2}], "Energy": [{"symbol": "XOM", "marketCap": 5}]},
+        ], top_n=2)
+        self.assertEqual([s["symbol"] for s in top["Technology"]], ["AAPL", "MSFT"])
+        self.assertEqual([s["symbol"] for s in top["Energy"]], ["XOM"])
+
+        breadth = merge_market_breadth([{"Technology": [1, 2, 0]}, {"Technology": [1, 1, 1], "Energy": [0, 2, 0]}])
+        self.assertEqual(breadth, {"Technology": [2, 3, 1], "Energy": [0, 2, 0]})
+
+    def test_run_sharded_inline(self):
+        """With one worker the shard task runs in-process with the given client."""
+        fmp_client = MagicMock()
+        fmp_client.get_sma.side_effect = lambda symbol: {"close": 10, "sma": 5 if symbol in ("AAPL", "XOM") else 20}
+
+        results = run_sharded(fmp_client, "market_breadth", STOCKS, workers=1)
+
+        self.assertEqual(merge_market_breadth(results), {"Technology": [1, 3, 0], "Energy": [1, 2, 0]})
+
+    def test_missing_sma_is_not_counted_below_average(self):
+        """Symbols without SMA data are counted as missing, not as below the average."""
+        fmp_client = MagicMock()
+        fmp_client.get_sma.side_effect = lambda symbol: None if symbol in ("MSFT", "NVDA") else {"close": 10, "sma": 5}
+
+        results = run_sharded(fmp_client, "market_breadth", STOCKS, workers=1)
+
+        self.assertEqual(merge_market_breadth(results), {"Technology": [1, 1, 2], "Energy": [2, 2, 0]})
+
+    def test_plan_rate_shares_by_expected_requests(self):
+        """Shares follow each task's expected request count so both finish together."""
+        request_counts = {
+            "top_market_caps": expected_requests("top_market_caps", 500),
+            "market_breadth": expected_requests("market_breadth", 500),
+        }
+        self.assertEqual(request_counts, {"top_market_caps": 5, "market_breadth": 500})
+
+        shares = plan_rate_shares(request_counts, workers=8)
+
+        self.assertAlmostEqual(parent_rate_share(workers=8) + sum(shares.values()), 1.0)
+        self.assertAlmostEqual(shares["market_breadth"] / shares["top_market_caps"], 100)
+        # With the default 300/min quota breadth gets almost all of the non-parent share
+        self.assertGreater(shares["market_breadth"] * 300, 235)
+        self.assertEqual(parent_rate_share(workers=1), 1.0)
+        self.assertEqual(plan_rate_shares(request_counts, workers=1), {"top_market_caps": 0.0, "market_breadth": 0.0})
+
+    def test_load_constituents_from_etf_holdings(self):
+        """Indexes without a constituents endpoint are built from ETF holdings and profiles."""
+        fmp_client = MagicMock()
+        fmp_client.get_etf_holdings.return_value = [{"asset": "DECK"}, {"asset": "EME"}]
+        fmp_client.get_profiles.return_value = [
+            {"symbol": "DECK", "sector": "Consumer Cyclical"},
+            {"symbol": "EME", "sector": "Industrials"},
+        ]
+
+        stocks = load_constituents(fmp_client, "sp400")
+
+        fmp_client.get_etf_holdings.assert_called_once_with("IJH")
+        self.assertEqual(stocks, [
+            {"symbol": "DECK", "sector": "Consumer Cyclical"},
+            {"symbol": "EME", "sector": "Industrials"},
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
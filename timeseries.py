@@ -0,0 +1,100 @@
+import math
+
+# 每份歷史文件以欄為單位儲存一個產業一整年的每日指標：
+# "dates" 為排序後的日期字串，其餘欄位與 "dates" 逐一對齊。
+HISTORY_COLUMNS = ["pe_today", "market_breadth_200d", "etf_roi", "top_prices"]
+
+
+def empty_history(sector: str, year: int) -> dict:
+    history = {"sector": sector, "year": year, "dates": []}
+    for column in HISTORY_COLUMNS:
+        history[column] = []
+    return history
+
+
+def history_point(row: dict) -> dict:
+    """
+    從 /api/industry-data 的單筆產業資料擷取要保存的每日指標。
+
+    當日 PE 由 update_sector_details 寫在 etf_roi 內，這裡一併取出。
+    """
+    etf_roi = dict(row.get("etf_roi") or {})
+    pe_today = row.get("pe_today")
+    if pe_today is None:
+        pe_today = etf_roi.get("pe_today")
+    etf_roi.pop("pe_today", None)
+    top_prices = {
+        stock["symbol"]: stock.get("price")
+        for stock in row.get("top_stocks") or []
+        if stock.get("symbol")
+    }
+    return {
+        "pe_today": pe_today,
+        "market_breadth_200d": row.get("market_breadth_200d"),
+        "etf_roi": etf_roi or None,
+        "top_prices": top_prices or None,
+    }
+
+
+def append_point(history: dict, day: str, point: dict) -> dict:
+    """
+    將一天的指標加入欄式歷史資料，並維持日期排序。同一天重複執行時
+    只覆蓋本次有值的欄位，為 None 的欄位 (本次未更新) 保留當天既有的值。
+    """
+    dates = history.setdefault("dates", [])
+    for column in HISTORY_COLUMNS:
+        history.setdefault(column, [None] * len(dates))
+
+    if day in dates:
+        index = dates.index(day)
+        for column in HISTORY_COLUMNS:
+            if point.get(column) is not None:
+                history[column][index] = point[column]
+        return history
+
+    index = len(dates)
+    while index > 0 and dates[index - 1] > day:
+        index -= 1
+    dates.insert(index, day)
+    for column in HISTORY_COLUMNS:
+        history[column].insert(index, point.get(column))
+    return history
+
+
+def concat_histories(histories: list) -> dict:
+    """將多個年份的歷史資料依日期先後串接為單一欄式資料。"""
+    merged = {"dates": []}
+    for column in HISTORY_COLUMNS:
+        merged[column] = []
+    for history in sorted(histories, key=lambda h: h.get("year", 0)):
+        dates = history.get("dates", [])
+        merged["dates"].extend(dates)
+        for column in HISTORY_COLUMNS:
+            merged[column].extend(history.get(column) or [None] * len(dates))
+    return merged
+
+
+def slice_range(history: dict, start: str, end: str) -> dict:
+    """取出 start 到 end (含) 之間的資料，日期皆為 YYYY-MM-DD 字串。"""
+    indexes = [i for i, day in enumerate(history["dates"]) if start <= day <= end]
+    return _select(history, indexes)
+
+
+def downsample(history: dict, max_points: int) -> dict:
+    """以固定間隔抽樣至最多 max_points 筆，並一定保留最新一筆。"""
+    count = len(history["dates"])
+    if max_points <= 0 or count <= max_points:
+        return history
+    stride = math.ceil(count / max_points)
+    indexes = list(range(0, count, stride))
+    if indexes[-1] != count - 1:
+        indexes[-1] = count - 1
+    return _select(history, indexes)
+
+
+def _select(history: dict, indexes: list) -> dict:
+    selected = {"dates": [history["dates"][i] for i in indexes]}
+    for column in HISTORY_COLUMNS:
+        values = history.get(column) or []
+        selected[column] = [values[i] if i < len(values) else None for i in indexes]
+    return selected
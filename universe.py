@@ -0,0 +1,232 @@
+import logging
+import math
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from cassette import get_active_cassette
+from fmp_client import FMPClient
+from profiling import profiled
+from rate_limiter import RateController
+
+logger = logging.getLogger(__name__)
+
+# 各指數的成分股來源與寫入的 Firestore 集合。
+# FMP 沒有 S&P 400 與 Russell 1000 的成分股端點，改以追蹤該指數的 ETF 持股 (IJH、IWB) 代替，
+# 產業別再由公司 profile 補上。
+UNIVERSES = {
+    "sp500": {"name": "S&P 500", "constituents": "get_sp500", "collection": "industry_data"},
+    "nasdaq100": {"name": "Nasdaq-100", "constituents": "get_nasdaq100", "collection": "industry_data_nasdaq100"},
+    "sp400": {"name": "S&P 400", "etf": "IJH", "collection": "industry_data_sp400"},
+    "russell1000": {"name": "Russell 1000", "etf": "IWB", "collection": "industry_data_russell1000"},
+}
+
+DEFAULT_UNIVERSE = "sp500"
+BATCH_SIZE = 100
+# 啟用多行程分片時保留給父行程 (成分股、即時股價、ETF 報酬率等非分片請求) 的 FMP 額度比例。
+PARENT_RATE_SHARE = float(os.getenv("FMP_PARENT_RATE_SHARE", "0.2"))
+
+
+def get_universe(key: str) -> dict:
+    if key not in UNIVERSES:
+        raise ValueError(f"Unknown universe '{key}'. Available universes: {', '.join(UNIVERSES)}")
+    return UNIVERSES[key]
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def load_constituents(fmp_client: FMPClient, key: str):
+    """
+    取得指數成分股，回傳含 'symbol' 與 'sector' 的字典列表；無法取得時回傳 None。
+    """
+    universe = get_universe(key)
+    if "constituents" in universe:
+        return getattr(fmp_client, universe["constituents"])()
+
+    holdings = fmp_client.get_etf_holdings(universe["etf"])
+    if not holdings:
+        return None
+    symbols = [item.get("asset") or item.get("symbol") for item in holdings]
+    symbols = [symbol for symbol in symbols if symbol]
+    stocks = []
+    for chunk in _chunks(symbols, BATCH_SIZE):
+        for profile in fmp_client.get_profiles(chunk) or []:
+            if profile.get("symbol") and profile.get("sector"):
+                stocks.append({"symbol": profile["symbol"], "sector": profile["sector"]})
+    return stocks
+
+
+def shard_stocks(stocks: list, shard_count: int, batch_size: int = 1) -> list:
+    """
+    依產業排序後每 batch_size 檔切成一批，各批輪流分配到各分片，
+    讓每個分片的股票數與產業組成都相近。缺少代號或產業的股票與重複代號會被略過。
+
+    批次在分片前就已切好，因此不論分片數為何，送出的批次請求都相同，
+    cassette 錄下的請求在不同核心數的機器上也能重播。
+    """
+    unique = {stock["symbol"]: stock for stock in stocks if stock.get("symbol") and stock.get("sector")}
+    ordered = sorted(unique.values(), key=lambda stock: (stock["sector"], stock["symbol"]))
+    batches = list(_chunks(ordered, batch_size))
+    shard_count = max(1, min(shard_count, len(batches)))
+    shards = [[] for _ in range(shard_count)]
+    for i, batch in enumerate(batches):
+        shards[i % shard_count].extend(batch)
+    return shards
+
+
+def top_market_caps_shard(fmp_client: FMPClient, stocks: list, top_n: int) -> dict:
+    """
+    計算一個分片內各產業市值前 top_n 名，回傳 {產業: [市值資料]}。
+    stocks 須為 shard_stocks 以 BATCH_SIZE 切好的分片，依序每 BATCH_SIZE 檔查詢一次。
+    """
+    sector_by_symbol = {stock["symbol"]: stock["sector"] for stock in stocks}
+    by_sector = defaultdict(list)
+    for chunk in _chunks(stocks, BATCH_SIZE):
+        for item in fmp_client.get_market_caps_for_list([stock["symbol"] for stock in chunk]) or []:
+            sector = sector_by_symbol.get(item.get("symbol"))
+            if sector:
+                by_sector[sector].append(item)
+    return {
+        sector: sorted(items, key=lambda x: x.get("marketCap") or 0, reverse=True)[:top_n]
+        for sector, items in by_sector.items()
+    }
+
+
+def merge_top_market_caps(shard_results: list, top_n: int) -> dict:
+    merged = defaultdict(list)
+    for result in shard_results:
+        for sector, items in result.items():
+            merged[sector].extend(items)
+    return {
+        sector: sorted(items, key=lambda x: x.get("marketCap") or 0, reverse=True)[:top_n]
+        for sector, items in merged.items()
+    }
+
+
+def market_breadth_shard(fmp_client: FMPClient, stocks: list) -> dict:
+    """
+    計算一個分片內各產業股價高於 200 日均線的家數，回傳 {產業: [高於均線家數, 有效家數, 缺漏家數]}。
+
+    取不到均線資料的股票 (API 錯誤、斷路器開啟等) 記為缺漏，不計入有效家數，
+    避免被當成「低於均線」而拉低廣度指標。
+    """
+    counts = defaultdict(lambda: [0, 0, 0])
+    for stock in stocks:
+        sector, symbol = stock.get("sector"), stock.get("symbol")
+        if not sector or not symbol:
+            continue
+        try:
+            indicator_data = fmp_client.get_sma(symbol)
+        except Exception as e:
+            logger.error(f"處理 {symbol} 時發生錯誤: {e}")
+            indicator_data = None
+        current_price = indicator_data.get("close") if indicator_data else None
+        sma_200 = indicator_data.get("sma") if indicator_data else None
+        if current_price is None or sma_200 is None:
+            counts[sector][2] += 1
+            continue
+        counts[sector][1] += 1
+        if current_price > sma_200:
+            counts[sector][0] += 1
+    return dict(counts)
+
+
+def merge_market_breadth(shard_results: list) -> dict:
+    merged = defaultdict(lambda: [0, 0, 0])
+    for result in shard_results:
+        for sector, (above, valid, missing) in result.items():
+            merged[sector][0] += above
+            merged[sector][1] += valid
+            merged[sector][2] += missing
+    return dict(merged)
+
+
+SHARD_TASKS = {
+    "top_market_caps": top_market_caps_shard,
+    "market_breadth": market_breadth_shard,
+}
+# 各分片任務每次請求涉及的股票數，分片時以此為單位切批。
+SHARD_BATCH_SIZES = {
+    "top_market_caps": BATCH_SIZE,
+    "market_breadth": 1,
+}
+
+
+def _run_shard(task: str, api_key: str, requests_per_minute: int, stocks: list, kwargs: dict):
+    # 每個 worker 行程有自己的速率控制器，分得整體額度的一部分。
+    controller = RateController(
+        requests_per_minute=requests_per_minute,
+        max_concurrency=1,
+        max_retries=int(os.getenv("FMP_MAX_RETRIES", "3")),
+    )
+    fmp_client = FMPClient(api_key=api_key, rate_controller=controller)
+    # worker 行程有自己的 profiler；PROFILE_JOBS 等環境變數由 spawn 繼承。
+    shard_task = profiled(f"shard.{task}.{os.getpid()}")(SHARD_TASKS[task])
+    return shard_task(fmp_client, stocks, **kwargs)
+
+
+def get_worker_count() -> int:
+    return max(1, int(os.getenv("MARKET_DATA_WORKERS", str(os.cpu_count() or 1))))
+
+
+def get_total_rate() -> int:
+    return int(os.getenv("FMP_RATE_LIMIT_PER_MINUTE", "300"))
+
+
+def parent_rate_share(workers: int = None) -> float:
+    """父行程可用的 FMP 額度比例；只有一個 worker 時所有請求都在父行程執行，取得全部額度。"""
+    workers = workers or get_worker_count()
+    if workers <= 1:
+        return 1.0
+    return min(max(PARENT_RATE_SHARE, 0.0), 1.0)
+
+
+def expected_requests(task: str, stock_count: int) -> int:
+    """分片任務處理 stock_count 檔股票預計送出的 FMP 請求數 (每批一次)。"""
+    return math.ceil(stock_count / SHARD_BATCH_SIZES[task])
+
+
+def plan_rate_shares(request_counts: dict, workers: int = None) -> dict:
+    """
+    將父行程以外的 FMP 額度依各分片任務預計的請求數 ({任務: 請求數}) 按比例分配，
+    回傳 {任務: 額度比例}，讓同時執行的任務大致同時完成，不會有任務提早結束而閒置其額度。
+    """
+    available = 1.0 - parent_rate_share(workers)
+    total = sum(request_counts.values())
+    if total <= 0:
+        return {task: available / len(request_counts) for task in request_counts}
+    return {task: available * count / total for task, count in request_counts.items()}
+
+
+def run_sharded(fmp_client: FMPClient, task: str, stocks: list, workers: int = None,
+                rate_share: float = None, **kwargs) -> list:
+    """
+    將股票清單分片後交給多個 worker 行程執行 task，回傳各分片結果。
+    workers 為 1 時直接在目前行程中以既有的 client 執行。
+
+    rate_share 為此任務所有 worker 合計可用的 FMP 額度比例 (見 plan_rate_shares)，
+    未指定時取得父行程以外的全部額度。
+    """
+    workers = workers or get_worker_count()
+    shards = shard_stocks(stocks, workers, SHARD_BATCH_SIZES[task])
+    if len(shards) <= 1:
+        return [SHARD_TASKS[task](fmp_client, shards[0], **kwargs)]
+
+    if rate_share is None:
+        rate_share = 1.0 - parent_rate_share(workers)
+    per_worker_rate = max(1, int(get_total_rate() * rate_share / len(shards)))
+    logger.info(f"以 {len(shards)} 個行程分片執行 {task}（共 {len(stocks)} 檔股票，每個行程每分鐘 {per_worker_rate} 次請求）")
+    # 錄製模式下先由父行程建立 (清空) 封存檔，worker 行程只會附加紀錄。
+    get_active_cassette()
+    # 呼叫端可能位於 TaskGraph 的執行緒中，fork 會複製其他執行緒持有的鎖，因此改用 spawn。
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as executor:
+        futures = [
+            executor.submit(_run_shard, task, fmp_client.api_key, per_worker_rate, shard, kwargs)
+            for shard in shards
+        ]
+        return [future.result() for future in futures]